@@ -1,202 +1,294 @@
+import asyncio
+import json
 import math
+import sys
 import time
-import os
-from functools import lru_cache
+
+from asciirender import (BACKENDS, BandWorkers, ChunkedMesh, FrameCache, FrameGovernor, FrameServer, FrameStats, Mesh,
+                         Renderer, Scene, TerminalPresenter, build_mesh_caches, contact_sheet, render_turntable,
+                         upscale_frame)
+from asciirender.chunked import CHUNK_MEMORY_BUDGET
+from asciirender.memprofile import MEMPROFILE_FRAMES, profile_memory
+from asciirender.renderer import np
 
 
 # Screen properties
 SCREEN_WIDTH = 150
 SCREEN_HEIGHT = 75
-CAMERA_DISTANCE = 5
-
-# Precomputed screen constants
-HALF_SCREEN_WIDTH = SCREEN_WIDTH // 2
-HALF_SCREEN_HEIGHT = SCREEN_HEIGHT // 2
-
-# ASCII character aspect ratio (approximately 2:1 height to width)
-ASPECT_RATIO = 2.0
 
 # Rotation speed
 ROTATION_SPEED = 0.1
 
-# Precomputed projection factor
-PROJECTION_FACTOR = min(SCREEN_WIDTH, SCREEN_HEIGHT * ASPECT_RATIO) * CAMERA_DISTANCE / 4
-
-# ASCII character palette for depth (from darkest to lightest)
-# PALETTE = ' .:-=+*#%@'
-PALETTE = ' .:!/r(l1Z4H9W8$@'
-PALETTE_SIZE = len(PALETTE) - 1
-
-# Depth mapping steepness
-DEPTH_STEEPNESS = 2.5
-
-def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
-
-@lru_cache(maxsize=None)
-def get_sin(angle):
-    return math.sin(angle)
-
-@lru_cache(maxsize=None)
-def get_cos(angle):
-    return math.cos(angle)
-
-def rotate_point(x, y, z, angle_x, angle_y, angle_z):
-    # Rotate around X-axis
-    y, z = y * math.cos(angle_x) - z * math.sin(angle_x), y * math.sin(angle_x) + z * math.cos(angle_x)
-    
-    # Rotate around Y-axis
-    x, z = x * math.cos(angle_y) + z * math.sin(angle_y), -x * math.sin(angle_y) + z * math.cos(angle_y)
-    
-    # Rotate around Z-axis
-    x, y = x * math.cos(angle_z) - y * math.sin(angle_z), x * math.sin(angle_z) + y * math.cos(angle_z)
-    
-    return x, y, z
-
-def project(x, y, z):
-    factor = PROJECTION_FACTOR / (z + CAMERA_DISTANCE)
-    return int(x * factor + HALF_SCREEN_WIDTH), int(y * factor / ASPECT_RATIO + HALF_SCREEN_HEIGHT)
-
-def calculate_normal(face_vertices):
-    v1 = [face_vertices[1][i] - face_vertices[0][i] for i in range(3)]
-    v2 = [face_vertices[2][i] - face_vertices[0][i] for i in range(3)]
-    return [
-        v1[1] * v2[2] - v1[2] * v2[1],
-        v1[2] * v2[0] - v1[0] * v2[2],
-        v1[0] * v2[1] - v1[1] * v2[0]
-    ]
-
-def normalize(vector):
-    magnitude = math.sqrt(sum(v * v for v in vector))
-    return [v / magnitude for v in vector] if magnitude != 0 else vector
-
-def dot_product(v1, v2):
-    return sum(a * b for a, b in zip(v1, v2))
-
-# Precompute depth mapping
-DEPTH_MAP = [PALETTE[min(int(math.pow(i / 256, DEPTH_STEEPNESS) * PALETTE_SIZE), PALETTE_SIZE)] for i in range(256)]
-
-def map_depth_to_char(z, normal, light_dir):
-    normalized_z = max(0, min(255, int((1 - (z + CAMERA_DISTANCE) / (2 * CAMERA_DISTANCE)) * 255)))
-    light_intensity = max(0, dot_product(normalize(normal), light_dir))
-    shading = (normalized_z + int(light_intensity * 255)) // 2
-    return DEPTH_MAP[shading]
-
-def interpolate_z(x, y, triangle, z_values):
-    x1, y1 = triangle[0]
-    x2, y2 = triangle[1]
-    x3, y3 = triangle[2]
-    
-    det = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
-    if abs(det) < 1e-6:
-        return (z_values[0] + z_values[1] + z_values[2]) / 3
-    
-    w1 = ((y2 - y3) * (x - x3) + (x3 - x2) * (y - y3)) / det
-    w2 = ((y3 - y1) * (x - x3) + (x1 - x3) * (y - y3)) / det
-    w3 = 1 - w1 - w2
-    
-    return w1 * z_values[0] + w2 * z_values[1] + w3 * z_values[2]
-
-def point_in_triangle(x, y, triangle):
-    def sign(p1, p2, p3):
-        return (p1[0] - p3[0]) * (p2[1] - p3[1]) - (p2[0] - p3[0]) * (p1[1] - p3[1])
-    
-    d1 = sign((x, y), triangle[0], triangle[1])
-    d2 = sign((x, y), triangle[1], triangle[2])
-    d3 = sign((x, y), triangle[2], triangle[0])
+# Extra angle about the X axis of each instance over the one before, with --instances
+INSTANCE_PHASE = 0.4
+
+# Views drawn by --preview as (angle_x, angle_y, angle_z), the size of each and the views per row
+PREVIEW_VIEWS = [
+    (0, 0, 0),                       # Front
+    (0, math.pi / 2, 0),             # Side
+    (math.pi / 2, 0, 0),             # Top
+    (0, math.pi, 0),                 # Back
+    (0, -math.pi / 2, 0),            # Other side
+    (math.pi / 6, math.pi / 4, 0),   # Three-quarter
+]
+PREVIEW_WIDTH = 75
+PREVIEW_HEIGHT = 37
+PREVIEW_COLUMNS = 3
+
+def loop_speeds(loop):
+    # ROTATION_SPEED per axis, rounded so each axis turns a whole number of times every
+    # loop frames, at least once
+    return [2 * math.pi * max(1, round(ROTATION_SPEED * factor * loop / (2 * math.pi))) / loop
+            for factor in (1, 0.7, 0.5)]
+
+def main(obj_file, backend='scanline', workers=1, show_stats=False, on_frame=None, lod=False,
+         target_fps=30, min_scale=0.5, cache_mb=None, loop=None, instances=None, depth_ordered=False,
+         deferred=False, chunked=False, chunk_budget=CHUNK_MEMORY_BUDGET):
+    # on_frame, if given, is called with each frame's FrameStats once it has been presented.
+    # With loop, the animation repeats exactly every loop frames, so with a frame cache of
+    # cache_mb megabytes the repeats cost only a lookup. With instances, that many copies
+    # of the model turn in a grid, each a little ahead of the one before. With chunked, the
+    # model is drawn from its chunked layout, chunk_budget bytes of it at a time.
+    frame_cache = FrameCache(int(cache_mb * (1 << 20))) if cache_mb else None
+    renderer = Renderer(SCREEN_WIDTH, SCREEN_HEIGHT, backend, frame_cache=frame_cache,
+                        depth_ordered=depth_ordered, deferred=deferred)
+    mesh = ChunkedMesh.load(obj_file) if chunked else Mesh.load(obj_file, lod=lod)
+    scene = Scene.grid(mesh, instances) if instances else None
+    band_workers = None
+    if workers > 1:
+        level = renderer.select_lod(mesh)
+        band_workers = BandWorkers(level.vertices, level.faces, workers, renderer)
 
-    has_neg = (d1 < 0) or (d2 < 0) or (d3 < 0)
-    has_pos = (d1 > 0) or (d2 > 0) or (d3 > 0)
-
-    return not (has_neg and has_pos)
-
-def load_obj(filename):
-    vertices = []
-    faces = []
-    
-    with open(filename, 'r') as file:
-        for line in file:
-            if line.startswith('v '):
-                vertices.append([float(coord) for coord in line.split()[1:]])
-            elif line.startswith('f '):
-                face = [int(vert.split('/')[0]) - 1 for vert in line.split()[1:]]
-                faces.append(face)
-    
-    # Center and scale the model
-    center = [sum(coord) / len(vertices) for coord in zip(*vertices)]
-    max_distance = max(max(abs(v[i] - center[i]) for v in vertices) for i in range(3))
-    scale = 1 / max_distance
-    
-    vertices = [[(v[i] - center[i]) * scale for i in range(3)] for v in vertices]
-    
-    return vertices, faces
-
-def calculate_face_depth(face_vertices):
-    return sum(vertex[2] for vertex in face_vertices) / len(face_vertices)
-
-def render_model(vertices, faces, angle_x, angle_y, angle_z):
-    zbuffer = [[float('-inf')] * SCREEN_WIDTH for _ in range(SCREEN_HEIGHT)]
-    screen = [[' ' for _ in range(SCREEN_WIDTH)] for _ in range(SCREEN_HEIGHT)]
-
-    light_dir = normalize([1, -1, 1])  # Light direction
-
-    rotated_vertices = [rotate_point(x, y, z, angle_x, angle_y, angle_z) for x, y, z in vertices]
-    projected_vertices = [project(x, y, z) for x, y, z in rotated_vertices]
-
-    # Render faces without sorting
-    for face in faces:
-        face_vertices = [rotated_vertices[i] for i in face]
-        projected_face = [projected_vertices[i] for i in face]
-
-        normal = calculate_normal(face_vertices)
-        
-        if normal[2] <= 0:  # Back-face culling
-            continue
-
-        min_x = max(0, min(x for x, _ in projected_face))
-        max_x = min(SCREEN_WIDTH - 1, max(x for x, _ in projected_face))
-        min_y = max(0, min(y for _, y in projected_face))
-        max_y = min(SCREEN_HEIGHT - 1, max(y for _, y in projected_face))
-
-        for y in range(min_y, max_y + 1):
-            for x in range(min_x, max_x + 1):
-                if point_in_triangle(x, y, projected_face[:3]):
-                    z = interpolate_z(x, y, projected_face[:3], [v[2] for v in face_vertices[:3]])
-                elif len(face) > 3 and point_in_triangle(x, y, [projected_face[0], projected_face[2], projected_face[3]]):
-                    z = interpolate_z(x, y, [projected_face[0], projected_face[2], projected_face[3]], 
-                                      [face_vertices[0][2], face_vertices[2][2], face_vertices[3][2]])
-                else:
-                    continue
-
-                if z > zbuffer[y][x]:
-                    zbuffer[y][x] = z
-                    screen[y][x] = map_depth_to_char(z, normal, light_dir)
-
-    return '\n'.join(''.join(row) for row in screen)
-
-def main(obj_file):
-    vertices, faces = load_obj(obj_file)
     angle_x = angle_y = angle_z = 0
+    speeds = loop_speeds(loop) if loop else None
+    frame_index = 0
+    previous_stats = FrameStats()
+    governor = FrameGovernor(target_fps, min_scale)
+    output_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
     try:
-        while True:
-            start_time = time.time()
-            model = render_model(vertices, faces, angle_x, angle_y, angle_z)
-            clear_screen()
-            print(model)
-            end_time = time.time()
-            # print(f"Angles: x={angle_x:.2f}, y={angle_y:.2f}, z={angle_z:.2f}")
-            print(f"Render time: {(end_time - start_time):.3f} seconds")
-            angle_x += ROTATION_SPEED
-            angle_y += ROTATION_SPEED * 0.7
-            angle_z += ROTATION_SPEED * 0.5
-            time.sleep(0.01)
-            # input("Press Enter to continue...")  # Added to pause between frames
+        with TerminalPresenter() as presenter:
+            while True:
+                stats = FrameStats()
+                frame_start = time.perf_counter_ns()
+                start_time = time.time()
+                stats.resolution = governor.resolution(*output_size)
+                frame_renderer = renderer.resized(*stats.resolution)
+                if scene is not None:
+                    for index, instance in enumerate(scene.instances):
+                        instance.angles = (angle_x + index * INSTANCE_PHASE, angle_y, angle_z)
+                    model = frame_renderer.render_scene(scene, stats)
+                elif band_workers is not None:
+                    model = band_workers.render(frame_renderer, angle_x, angle_y, angle_z, stats)
+                elif chunked:
+                    model = frame_renderer.render_chunked(mesh, angle_x, angle_y, angle_z, stats, chunk_budget)
+                else:
+                    model = frame_renderer.render(mesh, angle_x, angle_y, angle_z, stats)
+                end_time = time.time()
+                # Bytes written and stats are those of the previous frame, which is the last one
+                # fully measured
+                status = (f"Render time: {(end_time - start_time):.3f} seconds, "
+                          f"output: {presenter.bytes_written} bytes")
+                if show_stats:
+                    width, height = previous_stats.resolution or output_size
+                    if frame_cache is not None:
+                        status += f", cache {frame_cache.hits}/{frame_cache.hits + frame_cache.misses} hits"
+                    status += (f", resolution {width}x{height}, frame {previous_stats.frame_ns / 1e6:.1f} ms\n"
+                               + previous_stats.status_line())
+                present_start = time.perf_counter_ns()
+                presenter.present(f"{upscale_frame(model, *output_size)}\n{status}")
+                stats.stage_ns['present'] = time.perf_counter_ns() - present_start
+                stats.frame_ns = time.perf_counter_ns() - frame_start
+                governor.update(stats.frame_ns / 1e9)
+                if on_frame is not None:
+                    on_frame(stats)
+                previous_stats = stats
+                if speeds is not None:
+                    # Angles from the frame's place in the loop, so repeats are bit for bit equal
+                    frame_index = (frame_index + 1) % loop
+                    angle_x, angle_y, angle_z = (frame_index * speed for speed in speeds)
+                else:
+                    angle_x += ROTATION_SPEED
+                    angle_y += ROTATION_SPEED * 0.7
+                    angle_z += ROTATION_SPEED * 0.5
+                governor.wait()
     except KeyboardInterrupt:
         print("Exiting...")
+    finally:
+        if band_workers is not None:
+            band_workers.close()
+        if chunked:
+            mesh.close()
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <path_to_obj_file>")
+    import argparse
+    parser = argparse.ArgumentParser(description="Render a rotating OBJ model as ASCII art.")
+    parser.add_argument("obj_file", nargs="?", help="path to the .obj file")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="scanline",
+                        help="rasterizer to use; 'tiled' needs NumPy (default: scanline)")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="render screen bands in N worker processes with the tiled rasterizer; "
+                             "with --frames, the number of frame rendering processes (default: CPU count)")
+    parser.add_argument("--frames", type=int, metavar="COUNT",
+                        help="render COUNT turntable frames offline instead of animating interactively")
+    parser.add_argument("--step", type=float, default=2 * math.pi / 120, metavar="RADIANS",
+                        help="turntable rotation between frames (default: 1/120 turn)")
+    parser.add_argument("--format", choices=["text", "asciicast"], default="text",
+                        help="offline output: frames separated by form feeds, or an asciicast v2 recording")
+    parser.add_argument("--fps", type=float, default=20, help="asciicast playback rate (default: 20)")
+    parser.add_argument("--output", metavar="PATH", help="offline output file (default: stdout)")
+    parser.add_argument("--stats", action="store_true",
+                        help="show per-stage timings and rasterizer counters below the frame")
+    parser.add_argument("--target-fps", type=float, default=30, metavar="FPS",
+                        help="interactive frame rate to aim for; frames that take longer lower the "
+                             "render resolution (default: 30)")
+    parser.add_argument("--min-scale", type=float, default=0.5, metavar="SCALE",
+                        help="lowest render resolution as a fraction of the screen; 1 keeps the full "
+                             "resolution (default: 0.5)")
+    parser.add_argument("--cache-mb", type=float, metavar="MB",
+                        help="keep up to MB megabytes of finished frames and reuse them when an "
+                             "orientation comes round again, rendering in this process only (default: off)")
+    parser.add_argument("--loop", type=int, metavar="FRAMES",
+                        help="repeat the animation exactly every FRAMES frames, rounding the rotation "
+                             "speeds so each axis turns a whole number of times; pair with --cache-mb")
+    parser.add_argument("--depth-order", action="store_true",
+                        help="diagnostic: draw faces nearest first and skip faces already hidden, to show with "
+                             "--stats how much overdraw is left; the frames are the same, and it is no faster "
+                             "(scanline backend)")
+    parser.add_argument("--deferred", action="store_true",
+                        help="z-test first, keeping each cell's depth and face, then shade every covered cell "
+                             "once; the frames are the same (the tiled backend always works this way)")
+    parser.add_argument("--instances", type=int, metavar="N",
+                        help="show N copies of the model in a grid, rendered together as one scene "
+                             "(needs NumPy; not with --workers, --lod or --cache-mb)")
+    parser.add_argument("--lod", action="store_true",
+                        help="draw the coarsest simplified copy of the model whose error stays under "
+                             "one character cell at the screen size (needs NumPy)")
+    parser.add_argument("--chunked", action="store_true",
+                        help="draw the model from a chunked, memory-mapped copy written next to the .obj file on "
+                             "first use, streaming only the chunks that may be seen, for models larger than "
+                             "memory (needs NumPy; interactive view only)")
+    parser.add_argument("--chunk-budget", type=float, default=CHUNK_MEMORY_BUDGET / (1 << 20), metavar="MB",
+                        help="with --chunked, the megabytes of the model drawn at a time "
+                             f"(default: {CHUNK_MEMORY_BUDGET >> 20})")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="render once per frame and stream the animation to every client that connects "
+                             "to this TCP address, e.g. with `nc HOST PORT`, at --target-fps (default host: "
+                             "127.0.0.1)")
+    parser.add_argument("--preview", action="store_true",
+                        help="print a contact sheet of the model from the front, sides, top, back and "
+                             "three-quarter view to --output or stdout and exit")
+    parser.add_argument("--memprofile", metavar="PATH",
+                        help="render the animation with tracemalloc running and write peak, steady-state and "
+                             "per-stage memory figures (load, transform, raster, output) to PATH as JSON; "
+                             f"profiles --frames frames (default: {MEMPROFILE_FRAMES})")
+    parser.add_argument("--build-cache", metavar="DIR",
+                        help="write binary mesh caches for every .obj file in DIR and exit; "
+                             "with --lod, for every level of detail too")
+    args = parser.parse_args()
+    if not BACKENDS[args.backend].available():
+        parser.error(f"the {args.backend} backend requires NumPy")
+    if args.workers and args.workers > 1 and args.frames is None:
+        if np is None:
+            parser.error("--workers requires NumPy")
+        if not BACKENDS[args.backend].bands:
+            parser.error(f"the {args.backend} backend cannot draw in bands for --workers; use --backend tiled, "
+                         "or --workers with --frames")
+        if args.deferred:
+            parser.error("--deferred cannot be combined with --workers, except with --frames")
+    if args.target_fps <= 0:
+        parser.error("--target-fps must be positive")
+    if not 0 < args.min_scale <= 1:
+        parser.error("--min-scale must be greater than 0 and at most 1")
+    if args.cache_mb is not None and args.cache_mb <= 0:
+        parser.error("--cache-mb must be positive")
+    if args.loop is not None and args.loop <= 0:
+        parser.error("--loop must be positive")
+    if args.instances is not None:
+        if args.instances <= 0:
+            parser.error("--instances must be positive")
+        if np is None:
+            parser.error("--instances requires NumPy")
+        if (args.workers or 1) > 1 or args.lod or args.cache_mb or args.frames is not None:
+            parser.error("--instances cannot be combined with --workers, --lod, --cache-mb or --frames")
+    if args.depth_order and not BACKENDS[args.backend].depth_ordering:
+        parser.error(f"the {args.backend} backend does not support --depth-order")
+    if args.depth_order and (args.workers or 1) > 1 and args.frames is None:
+        parser.error("--depth-order cannot be combined with --workers, except with --frames")
+    if args.depth_order and args.deferred:
+        parser.error("--depth-order and --deferred cannot be combined")
+    if args.lod and np is None:
+        parser.error("--lod requires NumPy")
+    # --serve, --memprofile and --preview each run their own loop over one renderer and mesh
+    modes = [name for name, value in (('--serve', args.serve), ('--memprofile', args.memprofile),
+                                      ('--preview', args.preview)) if value]
+    if len(modes) > 1:
+        parser.error(f"{modes[0]} and {modes[1]} cannot be combined")
+    if modes:
+        if (args.workers or 1) > 1 or args.instances or args.cache_mb or args.loop is not None:
+            parser.error(f"{modes[0]} cannot be combined with --workers, --instances, --cache-mb or --loop")
+        if args.frames is not None and not args.memprofile:
+            parser.error(f"{modes[0]} cannot be combined with --frames")
+    if args.chunked:
+        if np is None:
+            parser.error("--chunked requires NumPy")
+        if args.chunk_budget <= 0:
+            parser.error("--chunk-budget must be positive")
+        if ((args.workers or 1) > 1 or args.instances or args.lod or args.cache_mb or args.depth_order or
+                args.deferred or args.frames is not None or args.serve or args.preview or args.memprofile or
+                args.build_cache):
+            parser.error("--chunked only works in the interactive view, without --workers, --instances, --lod, "
+                         "--cache-mb, --depth-order or --deferred")
+    if args.build_cache:
+        if np is None:
+            parser.error("the mesh cache requires NumPy")
+        build_mesh_caches(args.build_cache, args.lod)
+    elif not args.obj_file:
+        parser.error("an .obj file or --build-cache DIR is required")
+    elif args.serve:
+        host, _, port = args.serve.rpartition(':')
+        if not port.isdigit():
+            parser.error("--serve needs a port number")
+        server = FrameServer(Renderer(SCREEN_WIDTH, SCREEN_HEIGHT, args.backend, depth_ordered=args.depth_order,
+                                      deferred=args.deferred),
+                             Mesh.load(args.obj_file, lod=args.lod), args.target_fps, ROTATION_SPEED)
+        try:
+            asyncio.run(server.serve(host or '127.0.0.1', int(port), log=True))
+        except KeyboardInterrupt:
+            print("Exiting...")
+    elif args.memprofile:
+        renderer = Renderer(SCREEN_WIDTH, SCREEN_HEIGHT, args.backend, depth_ordered=args.depth_order,
+                            deferred=args.deferred)
+        profile = profile_memory(args.obj_file, renderer, args.frames or MEMPROFILE_FRAMES, args.lod,
+                                 rotation_speed=ROTATION_SPEED)
+        with open(args.memprofile, 'w') as file:
+            json.dump(profile, file, indent=2)
+        stages = ', '.join(f"{stage} {figures['peak_bytes_mean'] / 1024:.0f}"
+                           for stage, figures in profile['stages'].items())
+        print(f"Peak {profile['peak_bytes'] / 1024:.0f} KiB, "
+              f"steady state {profile['steady_state_bytes'] / 1024:.0f} KiB, "
+              f"per-frame stage peaks (KiB): {stages}; written to {args.memprofile}", file=sys.stderr)
+    elif args.preview:
+        renderer = Renderer(PREVIEW_WIDTH, PREVIEW_HEIGHT, args.backend, depth_ordered=args.depth_order,
+                            deferred=args.deferred)
+        sheet = contact_sheet(renderer.render_views(Mesh.load(args.obj_file, lod=args.lod), PREVIEW_VIEWS),
+                              PREVIEW_COLUMNS)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='\n') as output:
+                print(sheet, file=output)
+        else:
+            print(sheet)
+    elif args.frames is not None:
+        renderer = Renderer(SCREEN_WIDTH, SCREEN_HEIGHT, args.backend, depth_ordered=args.depth_order,
+                            deferred=args.deferred)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='\n') as output:
+                render_turntable(args.obj_file, args.frames, args.step, output, args.format,
+                                 args.fps, args.workers, renderer, args.lod)
+        else:
+            render_turntable(args.obj_file, args.frames, args.step, sys.stdout, args.format,
+                             args.fps, args.workers, renderer, args.lod)
     else:
-        main(sys.argv[1])
+        main(args.obj_file, args.backend, args.workers or 1, args.stats, lod=args.lod,
+             target_fps=args.target_fps, min_scale=args.min_scale, cache_mb=args.cache_mb, loop=args.loop,
+             instances=args.instances, depth_ordered=args.depth_order, deferred=args.deferred,
+             chunked=args.chunked, chunk_budget=int(args.chunk_budget * (1 << 20)))
@@ -0,0 +1,35 @@
+from .cache import FrameCache
+from .chunked import ChunkedMesh
+from .mesh import Mesh, build_mesh_caches, load_mesh, load_obj
+from .memprofile import profile_memory
+from .parallel import BandWorkers, render_turntable
+from .renderer import BACKENDS, Backend, Renderer, register_backend
+from .scene import Instance, Scene
+from .server import FrameServer
+from .stats import STAGES, FrameStats
+from .terminal import FrameGovernor, TerminalPresenter, contact_sheet, upscale_frame
+
+__all__ = [
+    'BACKENDS',
+    'Backend',
+    'BandWorkers',
+    'ChunkedMesh',
+    'FrameCache',
+    'FrameGovernor',
+    'FrameServer',
+    'FrameStats',
+    'Instance',
+    'Mesh',
+    'Renderer',
+    'STAGES',
+    'Scene',
+    'TerminalPresenter',
+    'build_mesh_caches',
+    'contact_sheet',
+    'load_mesh',
+    'load_obj',
+    'profile_memory',
+    'register_backend',
+    'render_turntable',
+    'upscale_frame',
+]
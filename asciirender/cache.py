@@ -0,0 +1,86 @@
+import math
+import sys
+import threading
+from collections import OrderedDict
+
+
+# Default memory budget of a frame cache
+FRAME_CACHE_BYTES = 64 << 20
+
+class FrameCache:
+    # Finished frames by mesh, camera angles and renderer settings, least recently used
+    # first, evicted once their total size passes max_bytes. With steps_per_turn, angles
+    # are snapped to that many steps per full turn and frames are rendered at the snapped
+    # angles, so nearby orientations share a frame; without it only exact repeats do.
+    # Keys hold the mesh itself rather than its id, so a freed mesh's id cannot be reused
+    # for stale frames. Safe to share between threads.
+    def __init__(self, max_bytes=FRAME_CACHE_BYTES, steps_per_turn=None):
+        self.max_bytes = max_bytes
+        self.steps_per_turn = steps_per_turn
+        self.frames = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def quantize(self, angle):
+        # Step index of an angle and the angle it is rendered at
+        if self.steps_per_turn is None:
+            return angle, angle
+        step = round(angle / (2 * math.pi) * self.steps_per_turn) % self.steps_per_turn
+        return step, step * 2 * math.pi / self.steps_per_turn
+
+    def key(self, renderer, mesh, angle_x, angle_y, angle_z):
+        # Cache key of a frame and the angles to render it at
+        (step_x, angle_x), (step_y, angle_y), (step_z, angle_z) = map(self.quantize, (angle_x, angle_y, angle_z))
+        key = (mesh, step_x, step_y, step_z, renderer.width, renderer.height, renderer.camera_distance,
+               renderer.aspect_ratio, renderer.palette, renderer.depth_steepness, renderer.depth_range,
+               renderer.nearest_wins)
+        return key, (angle_x, angle_y, angle_z)
+
+    def get(self, key):
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key, frame):
+        size = sys.getsizeof(frame)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.frames.pop(key, None)
+            if previous is not None:
+                self.size -= sys.getsizeof(previous)
+            self.frames[key] = frame
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.frames.popitem(last=False)
+                self.size -= sys.getsizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.size = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {
+            'frames': len(self.frames),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
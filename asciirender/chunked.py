@@ -0,0 +1,250 @@
+import mmap
+import os
+import struct
+
+from .mesh import face_normal_bins, parse_obj_blocks
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Out-of-core layout written next to each .obj file: a little-endian header with the
+# source size and mtime, a table of chunk records, then each chunk's float64 vertices,
+# int64 face numbers in the .obj file and int32 triangles of chunk-local vertex indices
+CHUNKED_SUFFIX = '.chunks'
+CHUNKED_MAGIC = b'ASCIICHK'
+CHUNKED_VERSION = 1
+CHUNKED_HEADER = struct.Struct('<8sIIQqQQ')
+CHUNK_RECORD = np.dtype([('offset', '<u8'), ('vertex_count', '<u8'), ('face_count', '<u8'),
+                         ('center', '<f8', 3), ('radius', '<f8'), ('axis', '<f8', 3),
+                         ('sine', '<f8')]) if np is not None else None
+
+# Chunks: faces are grouped by normal into this many bins per side of a cube around the
+# unit sphere and by centroid into a grid of this many cells per axis, and each group is
+# split into chunks of at most CHUNK_FACES faces
+CHUNK_NORMAL_BINS = 2
+CHUNK_GRID = 8
+CHUNK_FACES = 1 << 14
+
+# Vertices or faces handled at once while converting, which bounds its memory use
+CONVERT_BLOCK = 1 << 20
+
+# Default working memory of Renderer.render_chunked, and the bytes a vertex and a face of
+# a chunk are estimated to take while being drawn, mostly as Python lists
+CHUNK_MEMORY_BUDGET = 64 << 20
+CHUNK_VERTEX_BYTES = 400
+CHUNK_FACE_BYTES = 400
+
+def chunked_path(filename):
+    return filename + CHUNKED_SUFFIX
+
+def chunk_bounds(corners, unit, normal_bin):
+    # Bounding sphere (center of the bounding box) and normal cone of a chunk's faces, as
+    # build_meshlets computes them for meshlets
+    low, high = corners.min(axis=(0, 1)), corners.max(axis=(0, 1))
+    center = (low + high) / 2
+    offsets = corners - center
+    radius = np.sqrt((offsets * offsets).sum(axis=2).max())
+    axis = unit.sum(axis=0)
+    axis /= max(np.sqrt(axis @ axis), 1e-300)
+    cosine = (unit @ axis).min()
+    thin = normal_bin[0] == 6 * CHUNK_NORMAL_BINS * CHUNK_NORMAL_BINS
+    sine = 2.0 if thin or cosine <= 0 else np.sqrt(max(0.0, 1 - cosine * cosine))
+    return center, radius, axis, sine
+
+def write_chunked_mesh(filename):
+    # Converts an .obj file into the chunked layout in memory bounded by CONVERT_BLOCK,
+    # however large the file. Vertices and triangles are parsed block by block into
+    # temporary files, centered and scaled exactly as load_obj does, and the faces
+    # counting-sorted by normal bin and grid cell, keeping file order within each.
+    if np is None:
+        raise ImportError("chunked meshes need NumPy")
+    path = chunked_path(filename)
+    temp_path = path + '.tmp'
+    vertex_path, face_path, key_path, order_path = (temp_path + suffix for suffix in ('.v', '.f', '.k', '.o'))
+    source = os.stat(filename)
+    try:
+        # Coordinates are summed in file order, so the center is the same as load_obj's
+        totals = [0, 0, 0]
+        vertex_count = face_count = 0
+        with open(vertex_path, 'wb') as vertex_file, open(face_path, 'wb') as face_file:
+            for coords, triangles in parse_obj_blocks(filename):
+                totals = [sum(coords[i::3], totals[i]) for i in range(3)]
+                coords.tofile(vertex_file)
+                triangles.tofile(face_file)
+                vertex_count += len(coords) // 3
+                face_count += len(triangles) // 3
+        center = [total / vertex_count for total in totals]
+        # A file without faces gets an empty chunk table; there is nothing to map
+        raw = triangles = keys = order = None
+        ranges = []
+        if face_count:
+            raw = np.memmap(vertex_path, dtype=np.float64, mode='r', shape=(vertex_count, 3))
+            triangles = np.memmap(face_path, dtype=np.intc, mode='r', shape=(face_count, 3))
+            scale = 1 / max(np.abs(raw[start:start + CONVERT_BLOCK] - center).max()
+                            for start in range(0, vertex_count, CONVERT_BLOCK))
+
+            # Key of every face, and the number of faces per key
+            grid, bins = CHUNK_GRID, CHUNK_NORMAL_BINS
+            key_count = (6 * bins * bins + 1) * grid ** 3
+            keys = np.memmap(key_path, dtype=np.int32, mode='w+', shape=(face_count,))
+            counts = np.zeros(key_count, dtype=np.int64)
+            for start in range(0, face_count, CONVERT_BLOCK):
+                corners = (raw[triangles[start:start + CONVERT_BLOCK] - 1] - center) * scale
+                normal_bin = face_normal_bins(corners, bins)[1]
+                cells = np.clip(((corners.mean(axis=1) + 1) * (grid / 2)).astype(np.int64), 0, grid - 1)
+                block_keys = ((normal_bin * grid + cells[:, 0]) * grid + cells[:, 1]) * grid + cells[:, 2]
+                keys[start:start + len(block_keys)] = block_keys
+                counts += np.bincount(block_keys, minlength=key_count)
+
+            # Face numbers sorted by key
+            starts = np.cumsum(counts) - counts
+            cursor = starts.copy()
+            order = np.memmap(order_path, dtype=np.int64, mode='w+', shape=(face_count,))
+            for start in range(0, face_count, CONVERT_BLOCK):
+                block_keys = np.asarray(keys[start:start + CONVERT_BLOCK])
+                sorter = np.argsort(block_keys, kind='stable')
+                sorted_keys = block_keys[sorter]
+                group_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+                group_sizes = np.diff(np.r_[group_starts, len(sorted_keys)])
+                ranks = np.arange(len(sorted_keys)) - np.repeat(group_starts, group_sizes)
+                order[cursor[sorted_keys] + ranks] = sorter + start
+                cursor[sorted_keys[group_starts]] += group_sizes
+
+            ranges = [(start, min(start + CHUNK_FACES, end))
+                      for key_start, end in zip(starts.tolist(), (starts + counts).tolist())
+                      for start in range(key_start, end, CHUNK_FACES)]
+        table = np.zeros(len(ranges), dtype=CHUNK_RECORD)
+        offset = CHUNKED_HEADER.size + table.nbytes
+        # Write to a temporary file first so readers never see a half-written layout
+        with open(temp_path, 'wb') as file:
+            file.write(CHUNKED_HEADER.pack(CHUNKED_MAGIC, CHUNKED_VERSION, len(ranges), source.st_size,
+                                           source.st_mtime_ns, vertex_count, face_count))
+            file.write(table.tobytes())
+            for record, (start, end) in zip(table, ranges):
+                face_numbers = np.asarray(order[start:end])
+                used, local = np.unique(triangles[face_numbers].ravel() - 1, return_inverse=True)
+                vertices = (raw[used] - center) * scale
+                faces = local.reshape(-1, 3)
+                corners = vertices[faces]
+                record['center'], record['radius'], record['axis'], record['sine'] = chunk_bounds(
+                    corners, *face_normal_bins(corners, bins))
+                record['offset'], record['vertex_count'], record['face_count'] = offset, len(vertices), len(faces)
+                data = b''.join((vertices.astype('<f8').tobytes(), face_numbers.astype('<i8').tobytes(),
+                                 faces.astype('<i4').tobytes()))
+                data += bytes(-len(data) % 8)
+                file.write(data)
+                offset += len(data)
+            file.seek(CHUNKED_HEADER.size)
+            file.write(table.tobytes())
+        del raw, triangles, keys, order
+        os.replace(temp_path, path)
+    finally:
+        for temp in (vertex_path, face_path, key_path, order_path, temp_path):
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+    return path
+
+class ChunkedMesh:
+    # A mesh in the chunked layout, memory-mapped. Only the header and the chunk table are
+    # read when it is opened; each chunk's data is paged in when the chunk is drawn and
+    # dropped from the process again after, so culled chunks are never read at all.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, chunk_count, _, _, self.vertex_count, self.face_count = CHUNKED_HEADER.unpack_from(self.map)
+        if magic != CHUNKED_MAGIC or version != CHUNKED_VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a chunked mesh")
+        self.chunks = np.frombuffer(self.map, dtype=CHUNK_RECORD, count=chunk_count,
+                                    offset=CHUNKED_HEADER.size).copy()
+        self.centers, self.radii = self.chunks['center'], self.chunks['radius']
+        self.axes, self.sines = self.chunks['axis'], self.chunks['sine']
+        # Bound on the distance of any vertex from the origin, as Mesh.radius
+        self.radius = float((np.sqrt((self.centers * self.centers).sum(axis=1)) + self.radii).max(initial=0))
+
+    @classmethod
+    def load(cls, filename):
+        # Opens the chunked layout of an .obj file, converting the file first when the
+        # layout is missing or older than it
+        if np is None:
+            raise ImportError("chunked meshes need NumPy")
+        path = chunked_path(filename)
+        source = os.stat(filename)
+        try:
+            with open(path, 'rb') as file:
+                header = file.read(CHUNKED_HEADER.size)
+        except OSError:
+            header = b''
+        current = False
+        if len(header) == CHUNKED_HEADER.size:
+            magic, version, _, size, mtime_ns, _, _ = CHUNKED_HEADER.unpack(header)
+            current = (magic == CHUNKED_MAGIC and version == CHUNKED_VERSION and
+                       size == source.st_size and mtime_ns == source.st_mtime_ns)
+        if not current:
+            write_chunked_mesh(filename)
+        return cls(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.map.close()
+
+    def chunk(self, index):
+        # Views of a chunk's vertices, face numbers and triangles in the mapped file
+        record = self.chunks[index]
+        offset, vertex_count, face_count = int(record['offset']), int(record['vertex_count']), int(record['face_count'])
+        vertices = np.frombuffer(self.map, dtype='<f8', count=vertex_count * 3, offset=offset)
+        offset += vertices.nbytes
+        face_numbers = np.frombuffer(self.map, dtype='<i8', count=face_count, offset=offset)
+        faces = np.frombuffer(self.map, dtype='<i4', count=face_count * 3, offset=offset + face_numbers.nbytes)
+        return vertices.reshape(-1, 3), face_numbers, faces.reshape(-1, 3)
+
+    def release(self, index):
+        # Drops a chunk's pages from the process; they are read back if it is drawn again
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            record = self.chunks[index]
+            start = int(record['offset']) // mmap.PAGESIZE * mmap.PAGESIZE
+            end = int(record['offset']) + int(record['vertex_count']) * 24 + int(record['face_count']) * 20
+            self.map.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def read_batch(self, chunks):
+        # Yields the (vertices, face numbers, triangles) of a list of chunks once, one
+        # chunk's views or several concatenated, and releases the chunks when resumed
+        parts = [self.chunk(index) for index in chunks]
+        if len(parts) == 1:
+            yield parts[0]
+        else:
+            bases = np.cumsum([0] + [len(vertices) for vertices, _, _ in parts[:-1]])
+            yield (np.concatenate([vertices for vertices, _, _ in parts]),
+                   np.concatenate([face_numbers for _, face_numbers, _ in parts]),
+                   np.concatenate([faces + base for (_, _, faces), base in zip(parts, bases)]))
+        del parts
+        for index in chunks:
+            self.release(index)
+
+    def batches(self, indices, memory_budget=CHUNK_MEMORY_BUDGET):
+        # Yields (vertices, face numbers, triangles) of the given chunks in batches whose
+        # estimated working memory while drawn stays within memory_budget; a chunk over
+        # the budget is a batch of its own. Each batch's pages are released when the next
+        # is asked for.
+        batch, cost = [], 0
+        for index in indices:
+            record = self.chunks[index]
+            chunk_cost = int(record['vertex_count']) * CHUNK_VERTEX_BYTES + int(record['face_count']) * CHUNK_FACE_BYTES
+            if batch and cost + chunk_cost > memory_budget:
+                yield from self.read_batch(batch)
+                batch, cost = [], 0
+            batch.append(int(index))
+            cost += chunk_cost
+        if batch:
+            yield from self.read_batch(batch)
@@ -0,0 +1,116 @@
+import platform
+import sys
+import time
+import tracemalloc
+
+from .mesh import Mesh
+from .renderer import BACKENDS, np
+from .stats import FrameStats
+from .terminal import TerminalPresenter
+
+
+# Frames profiled by default, and how many of the first are left out of the steady-state
+# figures while per-thread buffers and caches fill up
+MEMPROFILE_FRAMES = 20
+MEMPROFILE_WARMUP = 2
+
+# Stages measured by profile_memory, in order: load runs once, the others every frame.
+# raster covers culling, setup, rasterization and shading, output the terminal diff.
+MEMORY_STAGES = ('load', 'transform', 'raster', 'output')
+
+def measure(function, *args):
+    # Runs function under tracemalloc and returns its result and the stage's figures: the
+    # highest traced memory above that at the start, the traced memory it left allocated,
+    # the change in allocated blocks, and the highest traced memory overall
+    blocks = sys.getallocatedblocks()
+    start = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = function(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    return result, {
+        'peak_bytes': peak - start,
+        'retained_bytes': current - start,
+        'blocks': sys.getallocatedblocks() - blocks,
+        'traced_peak_bytes': peak,
+    }
+
+def transform_frame(renderer, mesh, angle_x, angle_y, angle_z):
+    # The transform stage of Renderer.render: the level of detail and its transformed vertices
+    level = renderer.select_lod(mesh)
+    if np is None:
+        return (level, *renderer.transform_vertices(level.vertices, angle_x, angle_y, angle_z), level.faces)
+    faces = np.asarray(level.faces, dtype=np.int64).reshape(-1, 3)
+    return (level, *renderer.transform_vertex_array(level.vertices, angle_x, angle_y, angle_z), faces)
+
+def rasterize_frame(renderer, level, rotated, projected, faces, angles):
+    # The rest of Renderer.render, meshlet culling included
+    if np is not None and level.meshlets is not None:
+        faces = faces[renderer.cull_meshlets(level.meshlets, *angles)[0]]
+    return BACKENDS[renderer.backend].rasterize(renderer, rotated, projected, faces, stats=FrameStats())
+
+def profile_frame(renderer, mesh, presenter, angles):
+    # Stage figures of one frame; its arrays and text are released on return
+    (level, rotated, projected, faces), transform = measure(transform_frame, renderer, mesh, *angles)
+    frame, raster = measure(rasterize_frame, renderer, level, rotated, projected, faces, angles)
+    _, output = measure(lambda: presenter.diff(frame).encode())
+    return {'transform': transform, 'raster': raster, 'output': output}
+
+def summarize(records):
+    # Mean and largest stage figures over frame records
+    return {stage: {
+        'peak_bytes_mean': sum(record[stage]['peak_bytes'] for record in records) / len(records),
+        'peak_bytes_max': max(record[stage]['peak_bytes'] for record in records),
+        'retained_bytes_mean': sum(record[stage]['retained_bytes'] for record in records) / len(records),
+        'blocks_mean': sum(record[stage]['blocks'] for record in records) / len(records),
+    } for stage in MEMORY_STAGES[1:]}
+
+def profile_memory(obj_file, renderer, frames=MEMPROFILE_FRAMES, lod=False, use_cache=True, rotation_speed=0.1):
+    # Loads a model and renders frames of the interactive animation with tracemalloc
+    # running, stage by stage as Renderer.render and the terminal presenter would. Returns
+    # a JSON-ready dict: the load stage's figures, per-stage figures for every frame and
+    # summarized over the frames after MEMPROFILE_WARMUP, the traced memory between frames
+    # (steady state) and its growth per frame, and the highest traced memory overall.
+    # Memory-mapped mesh caches are not traced, so pass use_cache=False to count the
+    # parsed geometry.
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        mesh, load = measure(Mesh.load, obj_file, use_cache, lod)
+        presenter = TerminalPresenter()
+        records = []
+        for index in range(frames):
+            angles = (index * rotation_speed, index * rotation_speed * 0.7, index * rotation_speed * 0.5)
+            record = profile_frame(renderer, mesh, presenter, angles)
+            record['memory_bytes'] = tracemalloc.get_traced_memory()[0]
+            records.append(record)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    steady = records[MEMPROFILE_WARMUP:] or records
+    growth = ((steady[-1]['memory_bytes'] - steady[0]['memory_bytes']) / (len(steady) - 1)
+              if len(steady) > 1 else 0.0)
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__ if np is not None else None,
+            'platform': platform.platform(),
+            'model': obj_file,
+            'backend': renderer.backend,
+            'width': renderer.width,
+            'height': renderer.height,
+            'lod': lod,
+            'mesh_cache': use_cache,
+            'frames': frames,
+            'warmup': MEMPROFILE_WARMUP,
+        },
+        'load': load,
+        'stages': summarize(steady) if steady else {},
+        'steady_state_bytes': sum(record['memory_bytes'] for record in steady) / len(steady) if steady else 0,
+        'growth_bytes_per_frame': growth,
+        'peak_bytes': max([load['traced_peak_bytes']] + [record[stage]['traced_peak_bytes']
+                                                         for record in records for stage in MEMORY_STAGES[1:]]),
+        'frames': records,
+    }
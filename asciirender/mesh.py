@@ -0,0 +1,358 @@
+import math
+import os
+import re
+import struct
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Characters read per block when parsing OBJ files
+PARSE_BLOCK_SIZE = 1 << 22
+
+# Matches a block of face records that are all triangles, one per line
+TRIANGLE_RECORDS = re.compile(r'(?:[ \t]*\S+[ \t]+\S+[ \t]+\S+[ \t]*\n)*[ \t]*\S+[ \t]+\S+[ \t]+\S+[ \t]*')
+
+# Binary mesh cache written next to each .obj file: a little-endian header with the
+# source size and mtime, then float64 vertices, int32 triangles, the int32 meshlet of each
+# triangle and a float64 row per meshlet of its center, radius, cone axis and cone sine
+MESH_CACHE_SUFFIX = '.meshcache'
+MESH_CACHE_MAGIC = b'ASCIIMSH'
+MESH_CACHE_VERSION = 3
+MESH_CACHE_HEADER = struct.Struct('<8sIIQqQQQ')
+
+# Level-of-detail chain, finest first: vertex clustering grids in cells across the
+# model's largest extent
+LOD_GRIDS = (256, 128, 64, 32)
+
+# Meshlets: at most this many faces each, grouped by normal into this many bins per
+# side of each face of a cube around the unit sphere
+MESHLET_SIZE = 64
+MESHLET_NORMAL_BINS = 8
+
+# Slack in the meshlet normal cone tests for rounding
+MESHLET_CONE_MARGIN = 1e-6
+
+def parse_obj_lines(lines, coords, triangles, vertex_base=0):
+    # vertex_base is the number of vertices read before these lines, for negative indices
+    vertex_lines = [line for line in lines if line[:2] == 'v ']
+    face_lines = [line for line in lines if line[:2] == 'f ']
+
+    if face_lines and '-' in ''.join(face_lines):
+        # Negative indices count back from the vertices read so far, so keep file order
+        for line in lines:
+            if line[:2] == 'v ':
+                coords.extend(map(float, line.split()[1:4]))
+            elif line[:2] == 'f ':
+                count = vertex_base + len(coords) // 3
+                refs = [int(ref.split('/')[0]) for ref in line.split()[1:]]
+                refs = [ref + count + 1 if ref < 0 else ref for ref in refs]
+                for i in range(1, len(refs) - 1):
+                    triangles.extend((refs[0], refs[i], refs[i + 1]))
+        return
+
+    tokens = ' '.join(line[2:] for line in vertex_lines).split()
+    if len(tokens) == 3 * len(vertex_lines):
+        coords.extend(map(float, tokens))
+    else:
+        for line in vertex_lines:
+            coords.extend(map(float, line.split()[1:4]))
+
+    if not face_lines:
+        return
+    text = ' \n'.join(line[2:] for line in face_lines)
+    if '/' in text:
+        text = re.sub(r'/\S*', '', text)
+    if TRIANGLE_RECORDS.fullmatch(text):
+        triangles.extend(map(int, text.split()))
+        return
+
+    for line in text.split('\n'):
+        refs = line.split()
+        for i in range(1, len(refs) - 1):
+            triangles.extend((int(refs[0]), int(refs[i]), int(refs[i + 1])))
+
+def parse_obj_blocks(filename):
+    # Reads the file in large blocks and parses each block's v and f records in bulk,
+    # yielding them as flat typed arrays: xyz coordinates and 1-based vertex indices.
+    # Polygons are fan-triangulated and negative indices resolved, so faces always come in
+    # threes.
+    vertex_count = 0
+    remainder = ''
+    with open(filename, 'r') as file:
+        while True:
+            block = file.read(PARSE_BLOCK_SIZE)
+            lines = (remainder + block).split('\n')
+            remainder = lines.pop() if block else ''
+            coords = array('d')
+            triangles = array('i')
+            parse_obj_lines(lines, coords, triangles, vertex_count)
+            vertex_count += len(coords) // 3
+            yield coords, triangles
+            if not block:
+                break
+
+def parse_obj(filename):
+    # The whole file's coordinates and vertex indices, as parse_obj_blocks
+    coords = array('d')
+    triangles = array('i')
+    for block_coords, block_triangles in parse_obj_blocks(filename):
+        coords.extend(block_coords)
+        triangles.extend(block_triangles)
+    return coords, triangles
+
+def load_obj(filename):
+    coords, triangles = parse_obj(filename)
+    vertex_count = len(coords) // 3
+
+    # Center and scale the model
+    center = [sum(coords[i::3]) / vertex_count for i in range(3)]
+
+    if np is not None:
+        vertices = np.frombuffer(coords, dtype=np.float64).reshape(-1, 3) - center
+        vertices *= 1 / np.abs(vertices).max()
+        faces = np.frombuffer(triangles, dtype=np.intc).reshape(-1, 3) - 1
+        return vertices, faces
+
+    max_distance = max(max(abs(v - center[i]) for v in coords[i::3]) for i in range(3))
+    scale = 1 / max_distance
+    vertices = [[(coords[j + i] - center[i]) * scale for i in range(3)] for j in range(0, len(coords), 3)]
+    faces = [[triangles[j] - 1, triangles[j + 1] - 1, triangles[j + 2] - 1] for j in range(0, len(triangles), 3)]
+    return vertices, faces
+
+def mesh_cache_path(filename, level=0):
+    # Level 0 is the full mesh, higher levels the simplified meshes of the LOD chain
+    return filename + (f'.lod{level}' if level else '') + MESH_CACHE_SUFFIX
+
+def read_mesh_cache(filename, level=0):
+    # Memory-maps the cached mesh, or returns None if it is missing or stale
+    path = mesh_cache_path(filename, level)
+    try:
+        source = os.stat(filename)
+        with open(path, 'rb') as file:
+            header = file.read(MESH_CACHE_HEADER.size)
+            cache_size = os.fstat(file.fileno()).st_size
+    except OSError:
+        return None
+    if len(header) != MESH_CACHE_HEADER.size:
+        return None
+
+    (magic, version, face_width, size, mtime_ns, vertex_count, face_count,
+     meshlet_count) = MESH_CACHE_HEADER.unpack(header)
+    faces_offset = MESH_CACHE_HEADER.size + vertex_count * 3 * 8
+    face_meshlet_offset = faces_offset + face_count * face_width * 4
+    meshlets_offset = face_meshlet_offset + face_count * 4
+    if (magic != MESH_CACHE_MAGIC or version != MESH_CACHE_VERSION or
+            size != source.st_size or mtime_ns != source.st_mtime_ns or
+            cache_size != meshlets_offset + meshlet_count * 8 * 8):
+        return None
+
+    vertices = np.memmap(path, dtype='<f8', mode='r',
+                         offset=MESH_CACHE_HEADER.size, shape=(vertex_count, 3))
+    faces = np.memmap(path, dtype='<i4', mode='r',
+                      offset=faces_offset, shape=(face_count, face_width))
+    face_meshlet = np.memmap(path, dtype='<i4', mode='r', offset=face_meshlet_offset, shape=(face_count,))
+    records = np.memmap(path, dtype='<f8', mode='r', offset=meshlets_offset, shape=(meshlet_count, 8))
+    return vertices, faces, (face_meshlet, records[:, 0:3], records[:, 3], records[:, 4:7], records[:, 7])
+
+def write_mesh_cache(filename, vertices, faces, meshlets, level=0):
+    source = os.stat(filename)
+    face_meshlet, centers, radii, axes, sines = meshlets
+    header = MESH_CACHE_HEADER.pack(MESH_CACHE_MAGIC, MESH_CACHE_VERSION, faces.shape[1],
+                                    source.st_size, source.st_mtime_ns, len(vertices), len(faces), len(radii))
+    # Write to a temporary file first so readers never see a half-written cache
+    temp_path = mesh_cache_path(filename, level) + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(header)
+        file.write(np.ascontiguousarray(vertices, dtype='<f8').tobytes())
+        file.write(np.ascontiguousarray(faces, dtype='<i4').tobytes())
+        file.write(np.ascontiguousarray(face_meshlet, dtype='<i4').tobytes())
+        file.write(np.column_stack((centers, radii, axes, sines)).astype('<f8').tobytes())
+    os.replace(temp_path, mesh_cache_path(filename, level))
+
+def load_mesh(filename, use_cache=True):
+    # load_obj as NumPy arrays, with the meshlets of build_meshlets, read from the binary
+    # cache when it is up to date
+    if use_cache:
+        mesh = read_mesh_cache(filename)
+        if mesh is not None:
+            return mesh
+
+    vertices, faces = load_obj(filename)
+    meshlets = build_meshlets(vertices, faces)
+    if use_cache:
+        try:
+            write_mesh_cache(filename, vertices, faces, meshlets)
+        except OSError:
+            pass  # Read-only location, keep going without a cache
+    return vertices, faces, meshlets
+
+def build_mesh_caches(directory, lod=False):
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith('.obj'):
+            path = os.path.join(directory, name)
+            start_time = time.time()
+            mesh = Mesh.load(path, lod=lod)
+            if lod:
+                faces = ', '.join(str(len(level.faces)) for level in [mesh] + [level for _, level in mesh.levels])
+                print(f"{path}: {faces} faces per level ({time.time() - start_time:.3f} seconds)")
+            else:
+                print(f"{path}: {len(mesh.vertices)} vertices, {len(mesh.faces)} faces "
+                      f"({time.time() - start_time:.3f} seconds)")
+
+def cluster_vertices(vertices, faces, cell):
+    # Simplifies a mesh by merging all vertices in each cubic cell of a grid laid over it
+    # into their mean, then dropping the faces that collapse
+    low = vertices.min(axis=0)
+    grid = int((vertices.max(axis=0) - low).max() / cell) + 1
+    cells = ((vertices - low) / cell).astype(np.int64)
+    _, cluster = np.unique((cells[:, 0] * grid + cells[:, 1]) * grid + cells[:, 2], return_inverse=True)
+    counts = np.bincount(cluster)
+    clustered = np.stack([np.bincount(cluster, vertices[:, axis]) / counts for axis in range(3)], axis=1)
+
+    faces = cluster[faces]
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    return clustered, faces[keep].astype(np.intc)
+
+def load_lods(filename, vertices, faces, use_cache=True):
+    # Simplified levels of a loaded mesh as (displacement, vertices, faces, meshlets), each
+    # cached like the full mesh. A merged vertex moves at most one cell diagonal, which is the
+    # level's displacement. Levels that barely remove any faces are skipped.
+    levels = []
+    face_count = len(faces)
+    extent = float((vertices.max(axis=0) - vertices.min(axis=0)).max())
+    for level, grid in enumerate(LOD_GRIDS, 1):
+        cell = extent / grid
+        mesh = read_mesh_cache(filename, level) if use_cache else None
+        if mesh is None:
+            mesh = cluster_vertices(vertices, faces, cell)
+            mesh += (build_meshlets(*mesh),)
+            if use_cache:
+                try:
+                    write_mesh_cache(filename, *mesh, level)
+                except OSError:
+                    pass
+        if len(mesh[1]) < face_count * 0.9:
+            levels.append((cell * math.sqrt(3), *mesh))
+            face_count = len(mesh[1])
+    return levels
+
+def spread_bits(values):
+    # Moves the low 10 bits of each value two bits apart, for interleaving into Morton codes
+    values = (values | values << 16) & 0x030000FF
+    values = (values | values << 8) & 0x0300F00F
+    values = (values | values << 4) & 0x030C30C3
+    return (values | values << 2) & 0x09249249
+
+def face_normal_bins(corners, bins):
+    # Unit normals of triangles given by their (m, 3, 3) corners, and a bin per face: bins x
+    # bins per side of a cube around the unit sphere, or 6 * bins * bins for faces too thin
+    # for their normal direction to survive rounding
+    edge1, edge2 = corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    normals = np.cross(edge1, edge2)
+    lengths = np.sqrt((normals * normals).sum(axis=1))
+    degenerate = lengths <= MESHLET_CONE_MARGIN * np.sqrt((edge1 * edge1).sum(axis=1) * (edge2 * edge2).sum(axis=1))
+    unit = normals / np.where(degenerate, 1, lengths)[:, None]
+
+    rows = np.arange(len(corners))
+    major_axis = np.abs(unit).argmax(axis=1)
+    major = np.maximum(np.abs(unit[rows, major_axis]), 1e-300)
+    u = np.minimum(((unit[rows, (major_axis + 1) % 3] / major + 1) * bins / 2).astype(np.int64), bins - 1)
+    v = np.minimum(((unit[rows, (major_axis + 2) % 3] / major + 1) * bins / 2).astype(np.int64), bins - 1)
+    normal_bin = ((major_axis * 2 + (unit[rows, major_axis] < 0)) * bins + u) * bins + v
+    normal_bin[degenerate] = 6 * bins * bins
+    return unit, normal_bin
+
+def build_meshlets(vertices, faces):
+    # Partitions the faces into meshlets of up to MESHLET_SIZE faces with similar normals,
+    # in Morton order of their centroids within each normal bin. Returns each face's meshlet
+    # and per meshlet a bounding sphere (center, radius) and a normal cone (unit axis and
+    # the sine of its half angle, 2 for meshlets that must never be cone culled).
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    corners = vertices[faces]
+    bins = MESHLET_NORMAL_BINS
+    unit, normal_bin = face_normal_bins(corners, bins)
+    rows = np.arange(len(faces))
+
+    centroids = corners.mean(axis=1)
+    low = vertices.min(axis=0)
+    scale = 1023 / max((vertices.max(axis=0) - low).max(), 1e-300)
+    cells = np.clip(((centroids - low) * scale).astype(np.int64), 0, 1023)
+    morton = spread_bits(cells[:, 0]) | spread_bits(cells[:, 1]) << 1 | spread_bits(cells[:, 2]) << 2
+    order = np.lexsort((morton, normal_bin))
+
+    # Split each bin's run of faces into meshlets
+    sorted_bins = normal_bin[order]
+    bin_starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+    rank = rows - np.repeat(bin_starts, np.diff(np.r_[bin_starts, len(faces)]))
+    starts = np.flatnonzero((rank % MESHLET_SIZE) == 0)
+    sorted_meshlet = np.cumsum((rank % MESHLET_SIZE) == 0) - 1
+    face_meshlet = np.empty(len(faces), dtype=np.int64)
+    face_meshlet[order] = sorted_meshlet
+
+    sorted_corners = corners[order]
+    centers = (np.minimum.reduceat(sorted_corners.min(axis=1), starts) +
+               np.maximum.reduceat(sorted_corners.max(axis=1), starts)) / 2
+    offsets = sorted_corners - centers[sorted_meshlet][:, None]
+    radii = np.sqrt(np.maximum.reduceat((offsets * offsets).sum(axis=2).max(axis=1), starts))
+
+    sorted_unit = unit[order]
+    axes = np.add.reduceat(sorted_unit, starts)
+    axes /= np.maximum(np.sqrt((axes * axes).sum(axis=1)), 1e-300)[:, None]
+    cosines = np.minimum.reduceat((sorted_unit * axes[sorted_meshlet]).sum(axis=1), starts)
+    sines = np.where(cosines > 0, np.sqrt(np.maximum(1 - cosines * cosines, 0)), 2.0)
+    sines[sorted_bins[starts] == 6 * bins * bins] = 2.0
+    return face_meshlet, centers, radii, axes, sines
+
+class Mesh:
+    # Loaded geometry: (n, 3) vertices and (m, 3) triangle vertex indices, as NumPy arrays
+    # or lists without NumPy. levels holds simplified copies for level of detail as
+    # (displacement, Mesh), finest first, where displacement is the farthest any vertex
+    # moved. Meshes are not changed after they are built, so renderers in several threads
+    # can share one.
+    def __init__(self, vertices, faces, levels=(), meshlets=None):
+        self.vertices = vertices
+        self.faces = faces
+        self.levels = list(levels)
+        self._meshlets = meshlets
+        if np is not None:
+            self.radius = math.sqrt((vertices * vertices).sum(axis=1).max()) if len(vertices) else 0.0
+        else:
+            self.radius = math.sqrt(max((x * x + y * y + z * z for x, y, z in vertices), default=0.0))
+
+    @classmethod
+    def load(cls, filename, use_cache=True, lod=False):
+        # Loads an .obj file, through the binary cache when NumPy is available, meshlets
+        # included. With lod, also builds (or reads back) the level-of-detail chain.
+        if np is None:
+            if lod:
+                raise ImportError("level of detail needs NumPy")
+            return cls(*load_obj(filename))
+        vertices, faces, meshlets = load_mesh(filename, use_cache)
+        levels = []
+        if lod:
+            levels = [(displacement, cls(level_vertices, level_faces, meshlets=level_meshlets))
+                      for displacement, level_vertices, level_faces, level_meshlets
+                      in load_lods(filename, vertices, faces, use_cache)]
+        return cls(vertices, faces, levels, meshlets)
+
+    @classmethod
+    def from_polygons(cls, vertices, polygons):
+        # Mesh of polygons given as vertex index lists, fan-triangulated like OBJ faces
+        faces = [(polygon[0], polygon[i], polygon[i + 1]) for polygon in polygons for i in range(1, len(polygon) - 1)]
+        if np is None:
+            return cls([list(vertex) for vertex in vertices], [list(face) for face in faces])
+        return cls(np.array(vertices, dtype=np.float64).reshape(-1, 3), np.array(faces, dtype=np.intc).reshape(-1, 3))
+
+    @property
+    def meshlets(self):
+        # Loaded with the mesh by Mesh.load, otherwise built on first use. Two threads may
+        # both build them; either result is the same.
+        if self._meshlets is None and np is not None:
+            self._meshlets = build_meshlets(self.vertices, self.faces)
+        return self._meshlets
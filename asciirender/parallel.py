@@ -0,0 +1,158 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+from .mesh import Mesh
+from .renderer import BACKENDS, Renderer
+from .stats import FrameStats
+from .terminal import TerminalPresenter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Screen bands per worker process in parallel mode, so busy bands can be balanced
+BANDS_PER_WORKER = 4
+
+# Frames a batch render may have in flight per worker process before waiting on the writer
+BATCH_FRAMES_PER_WORKER = 2
+
+# Renderer and shared mesh arrays of a band worker process, set by attach_band_worker
+band_renderer = None
+band_arrays = None
+
+def attach_band_worker(renderer, specs):
+    global band_renderer, band_arrays
+    band_renderer = renderer
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    band_arrays = (blocks, [np.ndarray(shape, dtype=dtype, buffer=block.buf)
+                            for block, (_, shape, dtype) in zip(blocks, specs)])
+
+def render_band(width, height, row_start, row_end):
+    rotated, projected, faces = band_arrays[1]
+    renderer = band_renderer.resized(width, height)
+    stats = FrameStats()
+    return BACKENDS[renderer.backend].rasterize(renderer, rotated, projected, faces, row_start, row_end, stats), stats
+
+class BandWorkers:
+    # Renders frames with a pool of worker processes, each rasterizing the faces that
+    # overlap one horizontal band of the screen with renderer's backend, which must draw
+    # in bands. The workers get the renderer once, when the pool starts; the faces and the
+    # per-frame transformed vertices live in shared memory, so only the screen size, band
+    # bounds and band text are pickled per frame.
+    def __init__(self, vertices, faces, workers, renderer):
+        if not BACKENDS[renderer.backend].bands:
+            raise ValueError(f"the {renderer.backend} backend cannot draw in bands")
+        vertices = np.asarray(vertices, dtype=np.float64)
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.vertices = vertices
+        self.blocks = []
+        self.rotated = self.share((len(vertices), 3), np.float64)
+        self.projected = self.share((len(vertices), 2), np.int64)
+        self.faces = self.share(faces.shape, np.int64)
+        self.faces[:] = faces
+        self.workers = workers
+        self.renderer = renderer
+
+        specs = [(block.name, array.shape, array.dtype.str)
+                 for block, array in zip(self.blocks, (self.rotated, self.projected, self.faces))]
+        self.pool = multiprocessing.Pool(workers, initializer=attach_band_worker, initargs=(renderer, specs))
+
+    def share(self, shape, dtype):
+        block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+        self.blocks.append(block)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def render(self, renderer, angle_x, angle_y, angle_z, stats=None):
+        # renderer must be configured as the one the pool was started with, but may be of
+        # another screen size. Stage times in stats are summed over all bands, so they add
+        # up worker time.
+        if renderer.__reduce__()[1][2:] != self.renderer.__reduce__()[1][2:]:
+            raise ValueError("band workers render with the configuration they were started with")
+        stage_start = time.perf_counter_ns()
+        self.rotated[:], self.projected[:] = renderer.transform_vertex_array(self.vertices, angle_x, angle_y, angle_z)
+        if stats is not None:
+            stats.stage_ns['transform'] += time.perf_counter_ns() - stage_start
+
+        # Bands follow the renderer's screen size, which the workers get with each band
+        band_count = min(renderer.height, self.workers * BANDS_PER_WORKER)
+        edges = [renderer.height * i // band_count for i in range(band_count + 1)]
+        bands = [(renderer.width, renderer.height, start, end) for start, end in zip(edges[:-1], edges[1:])]
+        bands = self.pool.starmap(render_band, bands)
+        if stats is not None:
+            for _, band_stats in bands:
+                stats.merge(band_stats)
+        return '\n'.join(text for text, _ in bands)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.rotated = self.projected = self.faces = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Renderer and mesh of a batch worker process, set by load_batch_worker
+batch_model = None
+
+def load_batch_worker(obj_file, renderer, lod=False):
+    global batch_model
+    batch_model = (renderer, Mesh.load(obj_file, lod=lod))
+
+def render_batch_frame(angles):
+    renderer, mesh = batch_model
+    return renderer.render(mesh, *angles)
+
+def render_turntable(obj_file, frames, step, output, output_format='text', fps=20, workers=None, renderer=None,
+                     lod=False):
+    # Renders frames turning the model step radians about the vertical axis each, across a
+    # process pool. Frames are written in order as soon as they and all earlier ones are done,
+    # with at most a few frames per worker held in memory.
+    renderer = renderer or Renderer()
+    workers = workers or os.cpu_count() or 1
+    angles = [(0, i * step, 0) for i in range(frames)]
+
+    if output_format == 'asciicast':
+        presenter = TerminalPresenter()
+        header = {'version': 2, 'width': renderer.width, 'height': renderer.height,
+                  'timestamp': int(time.time()), 'title': os.path.basename(obj_file)}
+        output.write(json.dumps(header) + '\n')
+
+    def write_frame(index, frame):
+        if output_format == 'asciicast':
+            data = ('\x1b[2J' if index == 0 else '') + presenter.diff(frame)
+            output.write(json.dumps([round(index / fps, 6), 'o', data]) + '\n')
+        else:
+            output.write(frame + '\n\f\n')
+        output.flush()
+
+    if workers <= 1:
+        load_batch_worker(obj_file, renderer, lod)
+        for index, frame_angles in enumerate(angles):
+            write_frame(index, render_batch_frame(frame_angles))
+        return
+
+    # Load the model here first, so on a cold mesh cache it is parsed and written once
+    # rather than by every worker at the same time
+    if np is not None:
+        Mesh.load(obj_file, lod=lod)
+    with multiprocessing.Pool(workers, initializer=load_batch_worker, initargs=(obj_file, renderer, lod)) as pool:
+        pending = deque()
+        for index, frame_angles in enumerate(angles):
+            pending.append(pool.apply_async(render_batch_frame, (frame_angles,)))
+            if len(pending) >= workers * BATCH_FRAMES_PER_WORKER:
+                write_frame(index - len(pending) + 1, pending.popleft().get())
+        for index in range(frames - len(pending), frames):
+            write_frame(index, pending.popleft().get())
@@ -0,0 +1,1041 @@
+import math
+import threading
+import time
+from array import array
+from itertools import repeat
+from functools import lru_cache
+
+from .chunked import CHUNK_MEMORY_BUDGET
+from .mesh import MESHLET_CONE_MARGIN
+from .stats import FrameStats
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Default screen properties
+SCREEN_WIDTH = 150
+SCREEN_HEIGHT = 75
+CAMERA_DISTANCE = 5
+
+# ASCII character aspect ratio (approximately 2:1 height to width)
+ASPECT_RATIO = 2.0
+
+# ASCII character palette for depth (from darkest to lightest)
+# PALETTE = ' .:-=+*#%@'
+PALETTE = ' .:!/r(l1Z4H9W8$@'
+
+# Depth mapping steepness
+DEPTH_STEEPNESS = 2.5
+
+# Tile size and per-tile face batch size of the tiled backend; the tile size is also that of
+# the coarse z-test of depth ordering
+TILE_WIDTH = 8
+TILE_HEIGHT = 4
+TILE_BATCH = 256
+
+# Largest on-screen vertex displacement, in character cells, a level of detail may cause
+LOD_MAX_ERROR = 1.0
+
+# Slack in the meshlet frustum test for rounding, in character cells around the screen
+MESHLET_SCREEN_MARGIN = 1
+
+# Smallest cosine between the view direction and every normal in a meshlet's cone for its
+# faces to be taken as front facing without a back-face test each, far enough from zero
+# that rounding in the per-face normals could not have culled any of them
+MESHLET_FRONT_MARGIN = 1e-3
+
+# Depth buckets faces are sorted into by depth ordering, and the slack in its coarse z-test
+# for rounding of interpolated depths
+DEPTH_ORDER_BUCKETS = 64
+DEPTH_ORDER_MARGIN = 1e-9
+
+# Renderers for other screen sizes kept by each renderer's resized()
+RESIZED_CACHE_SIZE = 16
+
+def rotate_point(x, y, z, angle_x, angle_y, angle_z):
+    # Rotate around X-axis
+    y, z = y * math.cos(angle_x) - z * math.sin(angle_x), y * math.sin(angle_x) + z * math.cos(angle_x)
+
+    # Rotate around Y-axis
+    x, z = x * math.cos(angle_y) + z * math.sin(angle_y), -x * math.sin(angle_y) + z * math.cos(angle_y)
+
+    # Rotate around Z-axis
+    x, y = x * math.cos(angle_z) - y * math.sin(angle_z), x * math.sin(angle_z) + y * math.cos(angle_z)
+
+    return x, y, z
+
+def frame_transform(angle_x, angle_y, angle_z):
+    # Sines and cosines for the whole frame, computed once instead of per vertex
+    return (math.sin(angle_x), math.cos(angle_x),
+            math.sin(angle_y), math.cos(angle_y),
+            math.sin(angle_z), math.cos(angle_z))
+
+def view_direction(angle_x, angle_y, angle_z):
+    # The rotation's last row: a model space normal n faces the camera after the rotation
+    # when n @ view_direction(...) > 0
+    return np.array([rotate_point(*unit, angle_x, angle_y, angle_z)[2] for unit in ((1, 0, 0), (0, 1, 0), (0, 0, 1))])
+
+def calculate_normal(face_vertices):
+    v1 = [face_vertices[1][i] - face_vertices[0][i] for i in range(3)]
+    v2 = [face_vertices[2][i] - face_vertices[0][i] for i in range(3)]
+    return [
+        v1[1] * v2[2] - v1[2] * v2[1],
+        v1[2] * v2[0] - v1[0] * v2[2],
+        v1[0] * v2[1] - v1[1] * v2[0]
+    ]
+
+def normalize(vector):
+    magnitude = math.sqrt(sum(v * v for v in vector))
+    return [v / magnitude for v in vector] if magnitude != 0 else vector
+
+def dot_product(v1, v2):
+    return sum(a * b for a, b in zip(v1, v2))
+
+# Light direction
+LIGHT_DIRECTION = normalize([1, -1, 1])
+
+@lru_cache(maxsize=None)
+def shading_tables(palette, depth_steepness):
+    # Depth map of 256 buckets to palette characters, the same as character codes for
+    # NumPy, and the depth map by light term and depth bucket as Latin-1 bytes, so shading
+    # a pixel is two lookups. Shared by all renderers with the same palette and steepness.
+    palette_size = len(palette) - 1
+    depth_map = [palette[min(int(math.pow(i / 256, depth_steepness) * palette_size), palette_size)] for i in range(256)]
+    depth_codes = np.array([ord(c) for c in depth_map], dtype='<u4') if np is not None else None
+    shade_map = [''.join(depth_map[(depth + light) // 2] for depth in range(256)).encode('latin-1')
+                 for light in range(256)]
+    return depth_map, depth_codes, shade_map
+
+def face_light_term(normal, light_dir):
+    # Light bucket of a face, constant over all its pixels
+    return int(max(0, dot_product(normalize(normal), light_dir)) * 255)
+
+def face_normal_arrays(rotated, faces):
+    # calculate_normal for every face of an (m, 3) index array, as x, y and z arrays. With
+    # (k, n, 3) rotated vertices of k views, the arrays are (k, m).
+    v0, v1, v2 = rotated[..., faces[:, 0], :], rotated[..., faces[:, 1], :], rotated[..., faces[:, 2], :]
+    edge1 = v1 - v0
+    edge2 = v2 - v0
+    return (edge1[..., 1] * edge2[..., 2] - edge1[..., 2] * edge2[..., 1],
+            edge1[..., 2] * edge2[..., 0] - edge1[..., 0] * edge2[..., 2],
+            edge1[..., 0] * edge2[..., 1] - edge1[..., 1] * edge2[..., 0])
+
+def light_intensity_array(normal_x, normal_y, normal_z):
+    # The light intensity face_light_term buckets, for arrays of normals, with the same
+    # operations in the same order
+    light_x, light_y, light_z = LIGHT_DIRECTION
+    magnitude = np.sqrt(normal_x * normal_x + normal_y * normal_y + normal_z * normal_z)
+    light_intensity = (normal_x / magnitude) * light_x + (normal_y / magnitude) * light_y + (normal_z / magnitude) * light_z
+    return np.maximum(light_intensity, 0)
+
+def light_term_array(normal_x, normal_y, normal_z):
+    # face_light_term for arrays of normals
+    return (light_intensity_array(normal_x, normal_y, normal_z) * 255).astype(np.int64)
+
+def front_face_array(normal_z, facing=None):
+    # The back-face test for arrays of rotated normal z values, skipped for the faces that
+    # facing, if given, marks as known to face the camera
+    if facing is None:
+        return normal_z > 0
+    visible = facing.copy()
+    mixed = np.flatnonzero(~facing)
+    visible[mixed] = normal_z[mixed] > 0
+    return visible
+
+def face_setups(rotated_vertices, projected_vertices, faces, width, height):
+    # Per face of lists of vertices and faces, what Renderer.draw_faces draws from: its
+    # bounding box clamped to a width x height screen, its edge functions and its vertex
+    # depths. The edge functions e1 = a1 * (x - x3) + b1 * (y - y3) and e2 = a2 * (x - x3) +
+    # b2 * (y - y3) are the barycentric numerators of the first two vertices, e3 = det - e1 -
+    # e2. Screen coordinates are integers, so stepping them keeps the weights exact.
+    setups = []
+    for face in faces:
+        (x1, y1), (x2, y2), (x3, y3) = [projected_vertices[i] for i in face]
+        a1, b1 = y2 - y3, x3 - x2
+        a2, b2 = y3 - y1, x1 - x3
+        setups.append((max(0, min(x1, x2, x3)), min(width - 1, max(x1, x2, x3)),
+                       max(0, min(y1, y2, y3)), min(height - 1, max(y1, y2, y3)),
+                       x3, y3, a1, b1, a2, b2, a1 * (x1 - x3) + b1 * (y1 - y3),
+                       *[rotated_vertices[i][2] for i in face]))
+    return setups
+
+def triangle_setup_arrays(p1, p2, p3):
+    # The edge functions of face_setups for arrays of (m, 2) screen points
+    x1, y1 = p1[:, 0], p1[:, 1]
+    x2, y2 = p2[:, 0], p2[:, 1]
+    x3, y3 = p3[:, 0], p3[:, 1]
+    a1, b1 = y2 - y3, x3 - x2
+    a2, b2 = y3 - y1, x1 - x3
+    det = a1 * (x1 - x3) + b1 * (y1 - y3)
+    return x3, y3, a1, b1, a2, b2, det
+
+def face_setup_arrays(rotated, projected, faces, width, height):
+    # face_setups for NumPy arrays of vertices and faces: an (11, m) integer array of the
+    # bounding boxes and edge functions and a (3, m) array of the vertex depths, a column
+    # per face
+    points = projected[faces.T]
+    xs, ys = points[..., 0], points[..., 1]
+    setups = np.stack((np.maximum(xs.min(axis=0), 0), np.minimum(xs.max(axis=0), width - 1),
+                       np.maximum(ys.min(axis=0), 0), np.minimum(ys.max(axis=0), height - 1),
+                       *triangle_setup_arrays(*points)))
+    return setups, rotated[faces.T, 2]
+
+def setup_rows(setups, depths):
+    # The faces of face_setup_arrays one at a time, as the tuples of face_setups, read from
+    # the arrays in place rather than converted to lists first
+    return zip(*map(memoryview, setups), *map(memoryview, depths))
+
+def tile_coverage_and_depth(setup, z_values, px, py):
+    # Coverage mask and interpolated depth of a batch of triangles (rows) at tile pixels (columns)
+    x3, y3, a1, b1, a2, b2, det = (v[:, None] for v in setup)
+    z1, z2, z3 = (v[:, None] for v in z_values)
+    e1 = a1 * (px - x3) + b1 * (py - y3)
+    e2 = a2 * (px - x3) + b2 * (py - y3)
+    e3 = det - e1 - e2
+    has_neg = (e1 < 0) | (e2 < 0) | (e3 < 0)
+    has_pos = (e1 > 0) | (e2 > 0) | (e3 > 0)
+    degenerate = det == 0
+    safe_det = np.where(degenerate, 1, det)
+    w1 = e1 / safe_det
+    w2 = e2 / safe_det
+    z = np.where(degenerate, (z1 + z2 + z3) / 3, w1 * z1 + w2 * z2 + (1 - w1 - w2) * z3)
+    return ~(has_neg & has_pos), z
+
+def depth_buckets(face_depths):
+    # Indices of faces in DEPTH_ORDER_BUCKETS buckets by each face's largest vertex z, given
+    # in face_depths: the largest z first, and file order within a bucket
+    buckets = [[] for _ in range(DEPTH_ORDER_BUCKETS)]
+    if not face_depths:
+        return buckets
+    highest = max(face_depths)
+    spread = highest - min(face_depths)
+    scale = (DEPTH_ORDER_BUCKETS - 1) / spread if spread else 0
+    for index, depth in enumerate(face_depths):
+        buckets[int((highest - depth) * scale)].append(index)
+    return buckets
+
+def depth_bucket_array(face_depths):
+    # The bucket of depth_buckets of each face, for an array of face depths
+    if not len(face_depths):
+        return np.zeros(0, dtype=np.int64)
+    highest = face_depths.max()
+    spread = highest - face_depths.min()
+    scale = (DEPTH_ORDER_BUCKETS - 1) / spread if spread else 0
+    return ((highest - face_depths) * scale).astype(np.int64)
+
+class Renderer:
+    # Renders meshes to ASCII frames of width x height characters. A renderer owns its
+    # configuration and shading tables and never changes them after construction. Each
+    # thread draws into its own z-buffer and character buffer, kept per renderer and
+    # cleared every frame, so one renderer can be shared by several threads.
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, backend='scanline', camera_distance=CAMERA_DISTANCE,
+                 aspect_ratio=ASPECT_RATIO, palette=PALETTE, depth_steepness=DEPTH_STEEPNESS, frame_cache=None,
+                 depth_ordered=False, deferred=False, depth_range=None, nearest_wins=False):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown backend {backend!r}")
+        if not BACKENDS[backend].available():
+            raise ValueError(f"the {backend} backend requires NumPy")
+        if depth_ordered and not BACKENDS[backend].depth_ordering:
+            raise ValueError(f"the {backend} backend does not support depth ordering")
+        if depth_ordered and deferred:
+            raise ValueError("depth ordering and deferred shading cannot be combined")
+        if depth_range is not None or nearest_wins:
+            if not BACKENDS[backend].depth_options:
+                raise ValueError(f"the {backend} backend does not support depth_range or nearest_wins")
+            if depth_ordered or deferred:
+                raise ValueError("depth_range and nearest_wins cannot be combined with depth ordering or deferred shading")
+        if any(ord(c) > 255 for c in palette):
+            raise ValueError("palette characters must be single bytes in Latin-1")
+        self.width = width
+        self.height = height
+        self.backend = backend
+        self.camera_distance = camera_distance
+        self.aspect_ratio = aspect_ratio
+        self.palette = palette
+        self.depth_steepness = depth_steepness
+        self.frame_cache = frame_cache  # FrameCache consulted by render, if any
+        self.depth_ordered = depth_ordered  # Whether rasterize_faces draws in depth order
+        self.deferred = deferred            # Whether rasterize_faces shades after the z-test
+        # (near, far) rotated z range that depth shading spans, and whether the z-test keeps
+        # the smallest z instead of the largest; see range_shader
+        self.depth_range = tuple(depth_range) if depth_range is not None else None
+        self.nearest_wins = nearest_wins
+
+        # Precomputed screen constants
+        self.half_width = width // 2
+        self.half_height = height // 2
+        self.projection_factor = min(width, height * aspect_ratio) * camera_distance / 4
+        self.depth_map, self.depth_codes, self.shade_map = shading_tables(palette, depth_steepness)
+
+        # Frames are drawn into flat buffers of rows stride apart, the last cell of each row
+        # but the last holding a newline, so the character buffer is the frame's text.
+        # Each thread gets its own pair, reset from these blank ones every frame.
+        self.stride = width + 1
+        self.blank_screen = '\n'.join([' ' * width] * height).encode('latin-1')
+        self.blank_zbuffer = array('d', [-math.inf]) * len(self.blank_screen)
+        self._buffers = threading.local()
+        self._resized = {}  # Renderers for other sizes by (width, height), kept for resized()
+        self._resized_lock = threading.Lock()
+
+    def __reduce__(self):
+        # Only the configuration is pickled; the tables are rebuilt, or found cached, on load.
+        # A frame cache stays with the process that made it.
+        return Renderer, (self.width, self.height, self.backend, self.camera_distance,
+                          self.aspect_ratio, self.palette, self.depth_steepness, None, self.depth_ordered,
+                          self.deferred, self.depth_range, self.nearest_wins)
+
+    def resized(self, width, height):
+        # The same renderer at another screen size. The last RESIZED_CACHE_SIZE sizes asked
+        # for are kept, so a frame governor moving between a few sizes reuses their
+        # renderers and buffers rather than building new ones every frame.
+        if (width, height) == (self.width, self.height):
+            return self
+        with self._resized_lock:
+            renderer = self._resized.pop((width, height), None)
+            if renderer is None:
+                renderer = Renderer(width, height, self.backend, self.camera_distance,
+                                    self.aspect_ratio, self.palette, self.depth_steepness, self.frame_cache,
+                                    self.depth_ordered, self.deferred, self.depth_range, self.nearest_wins)
+                while len(self._resized) >= RESIZED_CACHE_SIZE:
+                    del self._resized[next(iter(self._resized))]
+            self._resized[(width, height)] = renderer
+            return renderer
+
+    def project(self, x, y, z):
+        factor = self.projection_factor / (z + self.camera_distance)
+        return int(x * factor + self.half_width), int(y * factor / self.aspect_ratio + self.half_height)
+
+    def transform_vertices(self, vertices, angle_x, angle_y, angle_z):
+        # Rotate and project every vertex in one pass. The rotations are applied in the
+        # same order as rotate_point so screen coordinates and depths match it exactly.
+        if np is None:
+            sin_x, cos_x, sin_y, cos_y, sin_z, cos_z = frame_transform(angle_x, angle_y, angle_z)
+            projection_factor, camera_distance = self.projection_factor, self.camera_distance
+            half_width, half_height, aspect_ratio = self.half_width, self.half_height, self.aspect_ratio
+            rotated_vertices = []
+            projected_vertices = []
+            for x, y, z in vertices:
+                y, z = y * cos_x - z * sin_x, y * sin_x + z * cos_x
+                x, z = x * cos_y + z * sin_y, -x * sin_y + z * cos_y
+                x, y = x * cos_z - y * sin_z, x * sin_z + y * cos_z
+                factor = projection_factor / (z + camera_distance)
+                rotated_vertices.append((x, y, z))
+                projected_vertices.append((int(x * factor + half_width),
+                                           int(y * factor / aspect_ratio + half_height)))
+            return rotated_vertices, projected_vertices
+
+        rotated, projected = self.transform_vertex_array(vertices, angle_x, angle_y, angle_z)
+        return rotated.tolist(), projected.tolist()
+
+    def transform_vertex_array(self, vertices, angle_x, angle_y, angle_z):
+        # NumPy path of transform_vertices, returning (n, 3) rotated and (n, 2) screen arrays
+        sin_x, cos_x, sin_y, cos_y, sin_z, cos_z = frame_transform(angle_x, angle_y, angle_z)
+
+        vertices = np.asarray(vertices, dtype=np.float64)
+        x, y, z = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+        y, z = y * cos_x - z * sin_x, y * sin_x + z * cos_x
+        x, z = x * cos_y + z * sin_y, -x * sin_y + z * cos_y
+        x, y = x * cos_z - y * sin_z, x * sin_z + y * cos_z
+
+        factor = self.projection_factor / (z + self.camera_distance)
+        screen_x = (x * factor + self.half_width).astype(np.int64)
+        screen_y = (y * factor / self.aspect_ratio + self.half_height).astype(np.int64)
+
+        return np.stack((x, y, z), axis=1), np.stack((screen_x, screen_y), axis=1)
+
+    def transform_instances(self, vertices, trig, scales, positions):
+        # transform_vertex_array for k instances of the same vertices at once, each rotated
+        # by its row of frame_transform values in trig, then scaled and moved to its
+        # position. Returns (k, n, 3) rotated and (k, n, 2) screen arrays.
+        sin_x, cos_x, sin_y, cos_y, sin_z, cos_z = (trig[:, i, None] for i in range(6))
+
+        vertices = np.asarray(vertices, dtype=np.float64)
+        x, y, z = vertices[None, :, 0], vertices[None, :, 1], vertices[None, :, 2]
+        y, z = y * cos_x - z * sin_x, y * sin_x + z * cos_x
+        x, z = x * cos_y + z * sin_y, -x * sin_y + z * cos_y
+        x, y = x * cos_z - y * sin_z, x * sin_z + y * cos_z
+        scales = scales[:, None]
+        x = x * scales + positions[:, 0, None]
+        y = y * scales + positions[:, 1, None]
+        z = z * scales + positions[:, 2, None]
+
+        factor = self.projection_factor / (z + self.camera_distance)
+        screen_x = (x * factor + self.half_width).astype(np.int64)
+        screen_y = (y * factor / self.aspect_ratio + self.half_height).astype(np.int64)
+
+        return np.stack((x, y, z), axis=2), np.stack((screen_x, screen_y), axis=2)
+
+    def depth_bucket(self, z):
+        return max(0, min(255, int((1 - (z + self.camera_distance) / (2 * self.camera_distance)) * 255)))
+
+    def map_depth_to_char(self, z, normal, light_dir):
+        return self.depth_map[(self.depth_bucket(z) + face_light_term(normal, light_dir)) // 2]
+
+    def frame_buffers(self):
+        # The calling thread's z-buffer and character buffer, cleared for a new frame
+        buffers = getattr(self._buffers, 'frame', None)
+        if buffers is None:
+            buffers = self._buffers.frame = (array('d', self.blank_zbuffer), bytearray(self.blank_screen))
+        else:
+            buffers[0][:] = self.blank_zbuffer
+            buffers[1][:] = self.blank_screen
+        return buffers
+
+    def face_buffer(self):
+        # The calling thread's buffer of the index of the face that wrote each cell. It is
+        # never cleared, as a cell's entry is only read where the z-buffer was written.
+        owner = getattr(self._buffers, 'owner', None)
+        if owner is None:
+            owner = self._buffers.owner = array('l', [0]) * len(self.blank_zbuffer)
+        return owner
+
+    def select_lod(self, mesh):
+        # Coarsest level of the mesh whose on-screen error stays within LOD_MAX_ERROR. A
+        # vertex moved by a level's displacement cannot be nearer than the camera distance
+        # minus the model's radius at any rotation, which bounds how far it moves on screen.
+        nearest = self.camera_distance - mesh.radius
+        selected = mesh
+        if nearest <= 0:
+            return selected
+        for displacement, level in mesh.levels:
+            error = displacement * (1 / nearest + mesh.radius / (nearest * nearest))
+            if error * self.projection_factor <= LOD_MAX_ERROR:
+                selected = level
+        return selected
+
+    def cull_meshlets(self, meshlets, angle_x, angle_y, angle_z):
+        # Indices, in order, of the faces of meshlets that may have front faces on screen,
+        # and whether each is in a meshlet whose whole normal cone faces the camera, so
+        # that it needs no back-face test of its own
+        face_meshlet, centers, radii, axes, sines = meshlets
+        keep, facing = self.visible_clusters(centers, radii, axes, sines, [(angle_x, angle_y, angle_z)])
+        indices = np.flatnonzero(keep[0][face_meshlet])
+        return indices, facing[0][face_meshlet[indices]]
+
+    def visible_clusters(self, centers, radii, axes, sines, orientations):
+        # For each of a list of (angle_x, angle_y, angle_z) orientations, as (views,
+        # clusters) arrays: whether each cluster of faces (meshlet or chunk), given by its
+        # bounding sphere and normal cone, may have front faces on screen, and whether its
+        # whole cone faces the camera. A face survives back-face culling when the z of its
+        # rotated normal is positive, i.e. when its model space normal points along the
+        # rotation's last row. The cone's normals are at most its half angle from its axis,
+        # so the cosine of the axis's angle to that row plus the half angle bounds theirs
+        # from below. The spheres of all views are transformed in one stacked operation.
+        cosines = np.array([view_direction(*angles) for angles in orientations]) @ axes.T
+        keep = cosines > -sines - MESHLET_CONE_MARGIN
+        facing = (cosines * np.sqrt(np.maximum(1 - sines * sines, 0)) -
+                  np.sqrt(np.maximum(1 - cosines * cosines, 0)) * sines > MESHLET_FRONT_MARGIN)
+
+        trig = np.array([frame_transform(*angles) for angles in orientations]).reshape(-1, 6)
+        count = len(trig)
+        rotated = self.transform_instances(centers, trig, np.ones(count), np.zeros((count, 3)))[0]
+        in_front, on_screen = self.spheres_on_screen(rotated.reshape(-1, 3), np.tile(radii, count))
+        keep &= (~in_front | on_screen).reshape(keep.shape)
+        return keep, facing
+
+    def spheres_on_screen(self, centers, radii):
+        # For spheres with rotated (camera space) centers, whether each is entirely in front
+        # of the camera and, if so, whether it may overlap the screen. x / depth is extreme
+        # at the corners of the box around a sphere, as long as all of it is in front.
+        near = centers[:, 2] - radii + self.camera_distance
+        far = centers[:, 2] + radii + self.camera_distance
+        in_front = near > 0
+        near = np.where(in_front, near, 1)
+        on_screen = in_front.copy()
+        for axis, size, half, scale in ((0, self.width, self.half_width, self.projection_factor),
+                                        (1, self.height, self.half_height, self.projection_factor / self.aspect_ratio)):
+            low, high = centers[:, axis] - radii, centers[:, axis] + radii
+            bounds = np.stack((low / near, low / far, high / near, high / far)) * scale + half
+            on_screen &= ((bounds.max(axis=0) > -1 - MESHLET_SCREEN_MARGIN) &
+                          (bounds.min(axis=0) < size + MESHLET_SCREEN_MARGIN))
+        return in_front, on_screen
+
+    def render(self, mesh, angle_x, angle_y, angle_z, stats=None):
+        # Renders a Mesh with this renderer's backend, at the level of detail that suits
+        # the screen size and with meshlet culling when NumPy is available. Frames found in
+        # the frame cache are returned as they are, with stats.cached set.
+        frame_cache = self.frame_cache
+        if frame_cache is not None:
+            key, (angle_x, angle_y, angle_z) = frame_cache.key(self, mesh, angle_x, angle_y, angle_z)
+            frame = frame_cache.get(key)
+            if frame is not None:
+                if stats is not None:
+                    stats.cached = True
+                return frame
+
+        level = self.select_lod(mesh)
+        frame = BACKENDS[self.backend].render(self, level.vertices, level.faces, angle_x, angle_y, angle_z,
+                                              stats, level.meshlets)
+        if frame_cache is not None:
+            frame_cache.put(key, frame)
+        return frame
+
+    def render_scene(self, scene, stats=None):
+        # Renders every instance of a Scene into one frame. Instances are culled by bounding
+        # sphere first, and so are instances reaching the camera plane, which the
+        # rasterizers cannot clip. The rest are transformed one mesh at a time, all
+        # instances of a mesh in one batch, and rasterized together by this renderer's
+        # backend. Needs NumPy; level of detail and meshlet culling are not used.
+        if np is None:
+            raise ImportError("scene rendering needs NumPy")
+        if stats is None:
+            stats = FrameStats()
+        stage_start = time.perf_counter_ns()
+        rotated_parts, projected_parts, face_parts = [np.empty((0, 3))], [np.empty((0, 2), dtype=np.int64)], []
+        vertex_count = 0
+        for mesh, instances in scene.groups().items():
+            positions = np.array([instance.position for instance in instances], dtype=np.float64).reshape(-1, 3)
+            scales = np.array([instance.scale for instance in instances], dtype=np.float64)
+            visible = np.flatnonzero(self.spheres_on_screen(positions, mesh.radius * np.abs(scales))[1])
+            if not len(visible):
+                continue
+            trig = np.array([frame_transform(*instances[i].angles) for i in visible])
+            rotated, projected = self.transform_instances(mesh.vertices, trig, scales[visible], positions[visible])
+            count, vertices = rotated.shape[:2]
+            rotated_parts.append(rotated.reshape(-1, 3))
+            projected_parts.append(projected.reshape(-1, 2))
+            faces = np.asarray(mesh.faces, dtype=np.int64).reshape(-1, 3)
+            face_parts.append((faces + (vertex_count + vertices * np.arange(count))[:, None, None]).reshape(-1, 3))
+            vertex_count += count * vertices
+        rotated = np.concatenate(rotated_parts)
+        projected = np.concatenate(projected_parts)
+        faces = np.concatenate(face_parts) if face_parts else np.empty((0, 3), dtype=np.int64)
+        stats.stage_ns['transform'] += time.perf_counter_ns() - stage_start
+        return BACKENDS[self.backend].rasterize(self, rotated, projected, faces, stats=stats)
+
+    def render_views(self, mesh, orientations, stats=None):
+        # Renders a mesh from each of a list of (angle_x, angle_y, angle_z) orientations,
+        # returning the frames in order, the same as render would. The level of detail is
+        # picked once, all views are transformed in one stacked NumPy operation and meshlet
+        # culled in another, and, for backends with a rasterize_faces entry point, the faces
+        # kept in every view are back-face culled and lit together; only rasterization runs
+        # per view. The frame cache is not used. Falls back to one render per view without
+        # NumPy. It is no faster than separate render calls: the batched stages are bound by
+        # memory traffic, which batching does not reduce, and rasterization, most of a frame,
+        # still runs face by face. benchmark.py measures both; on the bundled models at
+        # 150x75 they are within about 10% of each other either way.
+        if np is None:
+            return [self.render(mesh, *angles, stats=stats) for angles in orientations]
+        if stats is None:
+            stats = FrameStats()
+        stage_start = time.perf_counter_ns()
+        level = self.select_lod(mesh)
+        faces = np.asarray(level.faces, dtype=np.int64).reshape(-1, 3)
+        trig = np.array([frame_transform(*angles) for angles in orientations]).reshape(-1, 6)
+        count = len(trig)
+        rotated, projected = self.transform_instances(level.vertices, trig, np.ones(count), np.zeros((count, 3)))
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stats.stage_ns['transform'] += stage_start - stage_end
+
+        # Faces of meshlets kept in each view, and whether their meshlet faces the camera
+        face_meshlet, centers, radii, axes, sines = level.meshlets
+        keep, facing = self.visible_clusters(centers, radii, axes, sines, orientations)
+        keep, facing = keep[:, face_meshlet], facing[:, face_meshlet]
+        backend = BACKENDS[self.backend]
+        if backend.rasterize_faces is None:
+            stats.stage_ns['cull'] += time.perf_counter_ns() - stage_start
+            return [backend.rasterize(self, rotated[view], projected[view], faces[keep[view]], stats=stats)
+                    for view in range(count)]
+
+        # Every kept (view, face) pair at once, the faces indexing the views' stacked vertices
+        views, kept = np.nonzero(keep)
+        normal_x, normal_y, normal_z = face_normal_arrays(rotated.reshape(-1, 3),
+                                                          faces[kept] + (views * rotated.shape[1])[:, None])
+        visible = front_face_array(normal_z, facing[views, kept])
+        light_terms = light_term_array(normal_x[visible], normal_y[visible], normal_z[visible])
+        kept = kept[visible]
+        ends = np.cumsum(np.bincount(views[visible], minlength=count)).tolist()
+        stats.stage_ns['cull'] += time.perf_counter_ns() - stage_start
+        return [backend.rasterize_faces(self, rotated[view], projected[view], faces[kept[start:end]],
+                                        light_terms[start:end], stats)
+                for view, (start, end) in enumerate(zip([0] + ends, ends))]
+
+    def render_chunked(self, chunked, angle_x, angle_y, angle_z, stats=None, memory_budget=CHUNK_MEMORY_BUDGET):
+        # Renders a ChunkedMesh without holding more than memory_budget of it at once.
+        # Chunks are culled by bounding sphere and normal cone from the chunk table alone,
+        # so culled chunks are never read from disk, and the rest are streamed through in
+        # batches: transformed, back-face culled and lit with NumPy, then drawn by
+        # rasterize_chunk into the one frame. The frame is the same as render gives for
+        # the model loaded whole. Needs NumPy; level of detail and the frame cache are not
+        # used. Every backend draws chunks with the scanline core, which gives the same
+        # frame; depth ordering, deferred shading, depth_range and nearest_wins are not
+        # supported.
+        if np is None:
+            raise ImportError("chunked rendering needs NumPy")
+        if self.depth_ordered or self.deferred or self.depth_range is not None or self.nearest_wins:
+            raise ValueError("chunked rendering does not support depth ordering, deferred shading, "
+                             "depth_range or nearest_wins")
+        if stats is None:
+            stats = FrameStats()
+        stage_start = time.perf_counter_ns()
+        zbuffer, screen = self.frame_buffers()
+        owner = self.face_buffer()
+        visible = self.visible_clusters(chunked.centers, chunked.radii, chunked.axes, chunked.sines,
+                                        [(angle_x, angle_y, angle_z)])[0][0]
+        stats.stage_ns['cull'] += time.perf_counter_ns() - stage_start
+        for vertices, face_numbers, faces in chunked.batches(np.flatnonzero(visible), memory_budget):
+            stage_start = time.perf_counter_ns()
+            rotated, projected = self.transform_vertex_array(vertices, angle_x, angle_y, angle_z)
+            stage_start, stage_end = time.perf_counter_ns(), stage_start
+            stats.stage_ns['transform'] += stage_start - stage_end
+            normal_x, normal_y, normal_z = face_normal_arrays(rotated, faces)
+            front = normal_z > 0
+            light_terms = light_term_array(normal_x[front], normal_y[front], normal_z[front])
+            stats.stage_ns['cull'] += time.perf_counter_ns() - stage_start
+            self.rasterize_chunk(rotated, projected, faces[front], face_numbers[front], light_terms,
+                                 zbuffer, screen, owner, stats)
+        stage_start = time.perf_counter_ns()
+        frame = screen.decode('latin-1')
+        stats.pixels_covered += len(zbuffer) - zbuffer.count(-math.inf)
+        stats.stage_ns['shade'] += time.perf_counter_ns() - stage_start
+        return frame
+
+    def draw_faces(self, faces, zbuffer, write=None, owner=None):
+        # The span walk and z-test that every scanline mode draws with. faces yields
+        # (number, payload, setup) per face, setup as face_setups gives it. A pixel is inside
+        # when no two edge functions have opposite signs, edges included. Each pixel a face
+        # wins the z-test for gets its z stored and write(payload, i, z) called, if write is
+        # given; with owner, the face's number is stored there too and on equal z the lower
+        # number wins. Returns the pixels tested and written.
+        stride = self.stride
+        ties = owner is not None
+        pixels_tested = pixels_written = 0
+        for number, payload, (min_x, max_x, min_y, max_y, x3, y3, a1, b1, a2, b2, det, z1, z2, z3) in faces:
+            a3 = -a1 - a2
+            signs = (1, -1) if det == 0 else (1,) if det > 0 else (-1,)
+            c1 = b1 * (min_y - y3) - a1 * x3
+            c2 = b2 * (min_y - y3) - a2 * x3
+            offset = min_y * stride
+            for y in range(min_y, max_y + 1):
+                start, end = min_x, max_x
+                for sign in signs:
+                    for a, c in ((a1, c1), (a2, c2), (a3, det - c1 - c2)):
+                        a, c = a * sign, c * sign
+                        if a > 0:
+                            start = max(start, -(c // a))
+                        elif a < 0:
+                            end = min(end, c // -a)
+                        elif c < 0:
+                            end = min_x - 1
+
+                if start <= end:
+                    pixels_tested += end - start + 1
+                    if det == 0:
+                        z = (z1 + z2 + z3) / 3
+                        for i in range(offset + start, offset + end + 1):
+                            if z > zbuffer[i] or (ties and z == zbuffer[i] and number < owner[i]):
+                                zbuffer[i] = z
+                                if ties:
+                                    owner[i] = number
+                                if write is not None:
+                                    write(payload, i, z)
+                                pixels_written += 1
+                    else:
+                        e1 = a1 * start + c1
+                        e2 = a2 * start + c2
+                        for i in range(offset + start, offset + end + 1):
+                            w1 = e1 / det
+                            w2 = e2 / det
+                            z = w1 * z1 + w2 * z2 + (1 - w1 - w2) * z3
+                            e1 += a1
+                            e2 += a2
+                            if z > zbuffer[i] or (ties and z == zbuffer[i] and number < owner[i]):
+                                zbuffer[i] = z
+                                if ties:
+                                    owner[i] = number
+                                if write is not None:
+                                    write(payload, i, z)
+                                pixels_written += 1
+
+                c1 += b1
+                c2 += b2
+                offset += stride
+        return pixels_tested, pixels_written
+
+    def depth_shader(self, screen):
+        # draw_faces write strategy shading each pixel into screen as map_depth_to_char: the
+        # payload is the face's row of the shade map, indexed by the depth bucket
+        camera_distance = self.camera_distance
+        depth_scale = 2 * camera_distance
+
+        def shade(shades, i, z):
+            screen[i] = shades[max(0, min(255, int((1 - (z + camera_distance) / depth_scale) * 255)))]
+        return shade
+
+    def range_shader(self, screen):
+        # draw_faces write strategy of the depth_range and nearest_wins options, shading
+        # every pixel as the cube demo always has: its depth normalized over depth_range (by
+        # default the range of the usual depth buckets) and the face's exact light intensity,
+        # the payload, are averaged, and only the average goes through the steepness curve.
+        # With nearest_wins the faces are drawn with negated depths, so the smallest z wins.
+        near, far = self.depth_range or (-self.camera_distance, self.camera_distance)
+        sign = -1 if self.nearest_wins else 1
+        palette, palette_size, steepness = self.palette, len(self.palette) - 1, self.depth_steepness
+
+        def shade(light_intensity, i, z):
+            normalized_z = max(0, min(1, 1 - (sign * z - near) / (far - near)))
+            shading = math.pow((normalized_z + light_intensity) / 2, steepness)
+            screen[i] = ord(palette[min(int(shading * palette_size), palette_size)])
+        return shade
+
+    def rasterize_chunk(self, rotated, projected, faces, face_numbers, light_terms, zbuffer, screen, owner, stats):
+        # rasterize_faces drawing one batch of chunks, as NumPy arrays, into buffers shared
+        # by the frame's batches. On equal z the face earlier in the .obj file wins, by its
+        # face number, as it does when all faces are drawn in file order.
+        stage_start = time.perf_counter_ns()
+        setups = setup_rows(*face_setup_arrays(rotated, projected, faces, self.width, self.height))
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stats.stage_ns['setup'] += stage_start - stage_end
+        pixels_tested, pixels_written = self.draw_faces(
+            zip(memoryview(face_numbers), map(self.shade_map.__getitem__, memoryview(light_terms)), setups),
+            zbuffer, self.depth_shader(screen), owner)
+        stats.stage_ns['raster'] += time.perf_counter_ns() - stage_start
+        stats.faces_rendered += len(faces)
+        stats.pixels_tested += pixels_tested
+        stats.pixels_written += pixels_written
+
+    def render_scanline(self, vertices, faces, angle_x, angle_y, angle_z, stats=None, meshlets=None):
+        if stats is None:
+            stats = FrameStats()
+        stage_start = time.perf_counter_ns()
+        if np is None:
+            rotated, projected = self.transform_vertices(vertices, angle_x, angle_y, angle_z)
+            stats.stage_ns['transform'] += time.perf_counter_ns() - stage_start
+            return self.rasterize_scanline(rotated, projected, faces, stats)
+
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        rotated, projected = self.transform_vertex_array(vertices, angle_x, angle_y, angle_z)
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stats.stage_ns['transform'] += stage_start - stage_end
+        facing = None
+        if meshlets is not None:
+            indices, facing = self.cull_meshlets(meshlets, angle_x, angle_y, angle_z)
+            faces = faces[indices]
+            stats.stage_ns['cull'] += time.perf_counter_ns() - stage_start
+        return self.rasterize_scanline(rotated, projected, faces, stats, facing)
+
+    def rasterize_scanline(self, rotated, projected, faces, stats=None, facing=None):
+        # Rasterizes transformed faces one at a time: rotated and projected vertices and
+        # faces as NumPy arrays, or as lists of tuples without NumPy. facing, with NumPy,
+        # marks the faces cull_meshlets found facing the camera, which skip the back-face
+        # test.
+        if stats is None:
+            stats = FrameStats()
+        stage_start = time.perf_counter_ns()
+
+        # Back-face culling and the light term of every face that survives it, for all faces
+        # at once when NumPy is available
+        if np is not None:
+            normal_x, normal_y, normal_z = face_normal_arrays(rotated, faces)
+            visible = front_face_array(normal_z, facing)
+            light_terms = light_term_array(normal_x[visible], normal_y[visible], normal_z[visible])
+            faces = faces[visible]
+        else:
+            visible_faces, light_terms = [], []
+            for face in faces:
+                normal = calculate_normal([rotated[i] for i in face])
+                if normal[2] > 0:
+                    visible_faces.append(face)
+                    light_terms.append(face_light_term(normal, LIGHT_DIRECTION))
+            faces = visible_faces
+        stats.stage_ns['cull'] += time.perf_counter_ns() - stage_start
+        return self.rasterize_faces(rotated, projected, faces, light_terms, stats)
+
+    def rasterize_faces(self, rotated, projected, faces, light_terms, stats):
+        # The scanline rasterizer proper, for transformed vertices and the front faces with
+        # their light terms: NumPy arrays, set up together and read in place, or lists
+        # without NumPy. The faces are drawn in file order, or in depth_buckets order when
+        # depth ordered, by draw_faces with the write strategy of the renderer's mode:
+        # shading each pixel that passes the z-test with a lookup in the face's row of the
+        # shade map, or, when deferred, recording only the face, to shade every covered cell
+        # once afterwards.
+        stage_ns = stats.stage_ns
+        stage_start = time.perf_counter_ns()
+        zbuffer, screen = self.frame_buffers()
+        ranged = self.depth_range is not None or self.nearest_wins
+        if np is not None:
+            setups, depths = face_setup_arrays(rotated, projected, faces, self.width, self.height)
+            if ranged:
+                light_intensities = memoryview(light_intensity_array(*face_normal_arrays(rotated, faces)))
+            if self.nearest_wins:
+                depths = -depths
+            if not self.depth_ordered:
+                setups = setup_rows(setups, depths)
+            face_terms = memoryview(light_terms)
+        else:
+            setups = face_setups(rotated, projected, faces, self.width, self.height)
+            if ranged:
+                light_intensities = [max(0, dot_product(normalize(calculate_normal([rotated[i] for i in face])),
+                                                        LIGHT_DIRECTION)) for face in faces]
+                if self.nearest_wins:
+                    setups = [(*setup[:11], -setup[11], -setup[12], -setup[13]) for setup in setups]
+            face_terms = light_terms
+            if self.depth_ordered:
+                numbers = [index for bucket in depth_buckets([max(setup[11:]) for setup in setups]) for index in bucket]
+                setups = [setups[index] for index in numbers]
+                face_terms = [light_terms[index] for index in numbers]
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stage_ns['setup'] += stage_start - stage_end
+
+        faces_rejected = 0
+        if self.depth_ordered and np is not None:
+            owner = self.face_buffer()
+            pixels_tested, pixels_written, faces_rejected = self.draw_depth_ordered(
+                setups, depths, light_terms, zbuffer, screen, owner)
+        elif self.depth_ordered:
+            owner = self.face_buffer()
+            pixels_tested, pixels_written = self.draw_faces(
+                zip(numbers, map(self.shade_map.__getitem__, face_terms), setups), zbuffer,
+                self.depth_shader(screen), owner)
+        elif self.deferred:
+            owner = self.face_buffer()
+            pixels_tested, pixels_written = self.draw_faces(zip(range(len(faces)), repeat(None), setups), zbuffer,
+                                                            owner=owner)
+        elif ranged:
+            pixels_tested, pixels_written = self.draw_faces(zip(repeat(0), light_intensities, setups), zbuffer,
+                                                            self.range_shader(screen))
+        else:
+            pixels_tested, pixels_written = self.draw_faces(
+                zip(repeat(0), map(self.shade_map.__getitem__, face_terms), setups), zbuffer,
+                self.depth_shader(screen))
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stage_ns['raster'] += stage_start - stage_end
+
+        # Unless deferred, the character buffer already holds the frame's text, newlines
+        # included, and the shade stage is just this conversion
+        if self.deferred:
+            frame = self.shade_faces(zbuffer, owner, screen, light_terms, stats)
+        else:
+            frame = screen.decode('latin-1')
+            stats.pixels_covered += len(zbuffer) - zbuffer.count(-math.inf)
+        stage_ns['shade'] += time.perf_counter_ns() - stage_start
+        stats.faces_rendered += len(faces)
+        stats.faces_rejected += faces_rejected
+        stats.pixels_tested += pixels_tested
+        stats.pixels_written += pixels_written
+        return frame
+
+    def shade_faces(self, zbuffer, owner, screen, light_terms, stats):
+        # Shades every cell the z-buffer shows written from its depth and the light term of
+        # the face owner gives for it, as map_depth_to_char, and returns the frame's text.
+        # Vectorized over the whole screen with NumPy.
+        camera_distance = self.camera_distance
+        if np is not None:
+            z = np.frombuffer(zbuffer)
+            drawn = np.flatnonzero(z != -np.inf)
+            z = z[drawn]
+            depth = np.clip(((1 - (z + camera_distance) / (2 * camera_distance)) * 255).astype(np.int64), 0, 255)
+            light = np.asarray(light_terms, dtype=np.int64)[np.frombuffer(owner, dtype=np.dtype('l'))[drawn]]
+            np.frombuffer(screen, dtype=np.uint8)[drawn] = self.depth_codes[(depth + light) // 2]
+            stats.pixels_covered += len(drawn)
+        else:
+            shade_map, depth_scale = self.shade_map, 2 * camera_distance
+            for i, z in enumerate(zbuffer):
+                if z != -math.inf:
+                    screen[i] = shade_map[light_terms[owner[i]]][
+                        max(0, min(255, int((1 - (z + camera_distance) / depth_scale) * 255)))]
+                    stats.pixels_covered += 1
+        return screen.decode('latin-1')
+
+    def draw_depth_ordered(self, setups, depths, light_terms, zbuffer, screen, owner):
+        # draw_faces for rasterize_faces, drawing the arrays of face_setup_arrays a bucket
+        # of depth_buckets at a time, so most pixels are written once. Before each bucket,
+        # the lowest z in every tile of the z-buffer is found, and the bucket's faces whose
+        # bounding box spans at most two by two tiles that all hold only z values above
+        # the face's largest are rejected before draw_faces sets up their spans. On equal z
+        # the face earlier in file order wins, as it does when drawing in file order, so the
+        # frame is the same. Returns the pixels tested and written and the faces rejected.
+        width, height, stride = self.width, self.height, self.stride
+        face_depths = depths.max(axis=0)
+        buckets = depth_bucket_array(face_depths)
+        order = np.argsort(buckets, kind='stable')
+        bounds = np.searchsorted(buckets[order], np.arange(DEPTH_ORDER_BUCKETS + 1)).tolist()
+
+        # The z-buffer as a grid, padded to whole tiles with +inf, and each face's corner tiles
+        tile_rows, tile_columns = (height + TILE_HEIGHT - 1) // TILE_HEIGHT, (width + TILE_WIDTH - 1) // TILE_WIDTH
+        cells = np.full((tile_rows * TILE_HEIGHT, tile_columns * TILE_WIDTH), np.inf)
+        grid = np.ndarray((height, width), dtype=np.float64, buffer=zbuffer, strides=(stride * 8, 8))
+        min_x, max_x = (np.clip(setups[k] // TILE_WIDTH, 0, tile_columns - 1) for k in (0, 1))
+        min_y, max_y = (np.clip(setups[k] // TILE_HEIGHT, 0, tile_rows - 1) for k in (2, 3))
+        testable = (max_x - min_x <= 1) & (max_y - min_y <= 1)
+
+        pixels_tested = pixels_written = faces_rejected = 0
+        shade_map = self.shade_map
+        shade = self.depth_shader(screen)
+        for start, end in zip(bounds, bounds[1:]):
+            faces = order[start:end]
+            if start and len(faces):
+                cells[:height, :width] = grid
+                tile_depths = cells.reshape(tile_rows, TILE_HEIGHT, tile_columns, TILE_WIDTH).min(axis=(1, 3))
+                x0, x1, y0, y1 = min_x[faces], max_x[faces], min_y[faces], max_y[faces]
+                hidden = testable[faces] & (np.minimum(np.minimum(tile_depths[y0, x0], tile_depths[y0, x1]),
+                                                       np.minimum(tile_depths[y1, x0], tile_depths[y1, x1])) >
+                                            face_depths[faces] + DEPTH_ORDER_MARGIN)
+                faces_rejected += int(hidden.sum())
+                faces = faces[~hidden]
+            if len(faces):
+                tested, written = self.draw_faces(
+                    zip(memoryview(faces), map(shade_map.__getitem__, memoryview(light_terms[faces])),
+                        setup_rows(setups[:, faces], depths[:, faces])), zbuffer, shade, owner)
+                pixels_tested += tested
+                pixels_written += written
+        return pixels_tested, pixels_written, faces_rejected
+
+    def render_tiled(self, vertices, faces, angle_x, angle_y, angle_z, stats=None, meshlets=None):
+        # Same output as render_scanline, computed with NumPy. Faces are binned into screen
+        # tiles, then coverage, depth and the z-test are evaluated for all pixels of a tile
+        # against a batch of faces at once. Ties keep the earliest face, like the sequential
+        # z-test.
+        if stats is None:
+            stats = FrameStats()
+        stage_start = time.perf_counter_ns()
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        rotated, projected = self.transform_vertex_array(vertices, angle_x, angle_y, angle_z)
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stats.stage_ns['transform'] += stage_start - stage_end
+        if meshlets is not None:
+            faces = faces[self.cull_meshlets(meshlets, angle_x, angle_y, angle_z)[0]]
+            stats.stage_ns['cull'] += time.perf_counter_ns() - stage_start
+        return self.rasterize_tiled(rotated, projected, faces, stats=stats)
+
+    def rasterize_tiled(self, rotated, projected, faces, row_start=0, row_end=None, stats=None):
+        # Rasterizes transformed faces into screen rows row_start to row_end - 1 and
+        # returns those rows as text
+        width, camera_distance = self.width, self.camera_distance
+        if row_end is None:
+            row_end = self.height
+        if stats is None:
+            stats = FrameStats()
+        stage_ns = stats.stage_ns
+        stage_start = time.perf_counter_ns()
+        rows = row_end - row_start
+
+        # Faces whose bounding box overlaps these rows, clamped to them
+        screen_y = projected[:, 1][faces]
+        min_y = np.maximum(row_start, screen_y.min(axis=1))
+        max_y = np.minimum(row_end - 1, screen_y.max(axis=1))
+        candidates = np.flatnonzero(min_y <= max_y)
+        faces = faces[candidates]
+        screen_points = projected[faces]
+        min_x = np.maximum(0, screen_points[:, :, 0].min(axis=1))
+        max_x = np.minimum(width - 1, screen_points[:, :, 0].max(axis=1))
+
+        # Back-face culling
+        normal_x, normal_y, normal_z = face_normal_arrays(rotated, faces)
+        visible = np.flatnonzero((normal_z > 0) & (min_x <= max_x))
+        min_y, max_y = min_y[candidates[visible]], max_y[candidates[visible]]
+        min_x, max_x = min_x[visible], max_x[visible]
+        stats.faces_rendered += len(visible)
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stage_ns['cull'] += stage_start - stage_end
+
+        points = screen_points[visible]
+        depths = rotated[faces[visible], 2]
+        triangle = triangle_setup_arrays(points[:, 0], points[:, 1], points[:, 2])
+        z_values = (depths[:, 0], depths[:, 1], depths[:, 2])
+
+        # Bin faces into every tile their bounding box touches, keeping file order within a tile
+        tiles_x = (width + TILE_WIDTH - 1) // TILE_WIDTH
+        tile_x0, tile_x1 = min_x // TILE_WIDTH, max_x // TILE_WIDTH
+        tile_y0, tile_y1 = (min_y - row_start) // TILE_HEIGHT, (max_y - row_start) // TILE_HEIGHT
+        span_x = tile_x1 - tile_x0 + 1
+        counts = span_x * (tile_y1 - tile_y0 + 1)
+        binned = np.repeat(np.arange(len(visible)), counts)
+        offsets = np.arange(len(binned)) - np.repeat(np.cumsum(counts) - counts, counts)
+        tile_ids = (tile_y0[binned] + offsets // span_x[binned]) * tiles_x + tile_x0[binned] + offsets % span_x[binned]
+        order = np.argsort(tile_ids, kind='stable')
+        binned, tile_ids = binned[order], tile_ids[order]
+        tile_starts = np.flatnonzero(np.r_[True, tile_ids[1:] != tile_ids[:-1]]) if len(tile_ids) else []
+
+        zbuffer = np.full((rows, width), -np.inf)
+        face_buffer = np.full((rows, width), -1, dtype=np.int64)
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stage_ns['setup'] += stage_start - stage_end
+
+        for start, end in zip(tile_starts, list(tile_starts[1:]) + [len(tile_ids)]):
+            tile_y, tile_x = divmod(int(tile_ids[start]), tiles_x)
+            x0, y0 = tile_x * TILE_WIDTH, tile_y * TILE_HEIGHT
+            x1, y1 = min(x0 + TILE_WIDTH, width), min(y0 + TILE_HEIGHT, rows)
+            py, px = np.mgrid[y0 + row_start:y1 + row_start, x0:x1]
+            px, py = px.ravel(), py.ravel()
+            tile_z = zbuffer[y0:y1, x0:x1].ravel()
+            tile_faces = face_buffer[y0:y1, x0:x1].ravel()
+
+            for batch_start in range(start, end, TILE_BATCH):
+                batch = binned[batch_start:min(batch_start + TILE_BATCH, end)]
+                inside = ((px >= min_x[batch, None]) & (px <= max_x[batch, None]) &
+                          (py >= min_y[batch, None]) & (py <= max_y[batch, None]))
+                covered, z = tile_coverage_and_depth([v[batch] for v in triangle], [v[batch] for v in z_values], px, py)
+                covered &= inside
+                z = np.where(covered, z, -np.inf)
+                stats.pixels_tested += int(np.count_nonzero(covered))
+
+                best = z.argmax(axis=0)
+                best_z = z[best, np.arange(len(px))]
+                closer = best_z > tile_z
+                tile_z[closer] = best_z[closer]
+                tile_faces[closer] = batch[best[closer]]
+                # Counted per batch: within a batch only the nearest face writes a pixel
+                stats.pixels_written += int(np.count_nonzero(closer))
+
+            zbuffer[y0:y1, x0:x1] = tile_z.reshape(y1 - y0, x1 - x0)
+            face_buffer[y0:y1, x0:x1] = tile_faces.reshape(y1 - y0, x1 - x0)
+        stage_start, stage_end = time.perf_counter_ns(), stage_start
+        stage_ns['raster'] += stage_start - stage_end
+
+        light_term = light_term_array(normal_x[visible], normal_y[visible], normal_z[visible])
+
+        # Shade every covered cell once, as map_depth_to_char
+        screen = np.full((rows, width + 1), ord(' '), dtype='<u4')
+        screen[:, -1] = ord('\n')
+        drawn = face_buffer >= 0
+        z = zbuffer[drawn]
+        normalized_z = np.clip(((1 - (z + camera_distance) / (2 * camera_distance)) * 255).astype(np.int64), 0, 255)
+        shading = (normalized_z + light_term[face_buffer[drawn]]) // 2
+        screen[:, :-1][drawn] = self.depth_codes[shading]
+        frame = screen.tobytes().decode('utf-32-le')[:-1]
+        stats.pixels_covered += len(z)
+        stage_ns['shade'] += time.perf_counter_ns() - stage_start
+        return frame
+
+class Backend:
+    # A rasterizer core that Renderer(backend=name) draws with. render takes vertex and face
+    # arrays and angles, as Renderer.render_scanline, and rasterize transformed vertices, as
+    # Renderer.rasterize_scanline. rasterize_faces, if given, takes lists of transformed
+    # vertices and of front faces with their light terms, as Renderer.rasterize_faces, so
+    # render_views can cull and light all views in one batch first. All three are called
+    # with the renderer first. The rest are capabilities.
+    def __init__(self, name, render, rasterize, rasterize_faces=None, needs_numpy=False, threads=True,
+                 depth_ordering=False, depth_options=False, bands=False):
+        self.name = name
+        self.render = render
+        self.rasterize = rasterize
+        self.rasterize_faces = rasterize_faces
+        self.needs_numpy = needs_numpy          # Whether it only works with NumPy installed
+        self.threads = threads                  # Whether one renderer may draw from several threads at once
+        self.depth_ordering = depth_ordering    # Whether it honours Renderer(depth_ordered=True)
+        self.depth_options = depth_options      # Whether it honours Renderer depth_range and nearest_wins
+        self.bands = bands                      # Whether rasterize takes row_start and row_end, for BandWorkers
+
+    def available(self):
+        return np is not None or not self.needs_numpy
+
+    def capabilities(self):
+        return {'needs_numpy': self.needs_numpy, 'threads': self.threads, 'depth_ordering': self.depth_ordering,
+                'depth_options': self.depth_options, 'bands': self.bands,
+                'face_lists': self.rasterize_faces is not None}
+
+# Rasterizer backends by name
+BACKENDS = {}
+
+def register_backend(name, render, rasterize, rasterize_faces=None, **capabilities):
+    # Makes a backend selectable by name, replacing any of the same name, and returns it
+    backend = BACKENDS[name] = Backend(name, render, rasterize, rasterize_faces, **capabilities)
+    return backend
+
+register_backend('scanline', Renderer.render_scanline, Renderer.rasterize_scanline, Renderer.rasterize_faces,
+                 depth_ordering=True, depth_options=True)
+register_backend('tiled', Renderer.render_tiled, Renderer.rasterize_tiled, needs_numpy=True, bands=True)
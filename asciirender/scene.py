@@ -0,0 +1,44 @@
+import math
+
+
+class Instance:
+    # One placement of a mesh in a scene: rotated by angles about the mesh's origin in the
+    # same order as rotate_point, then scaled and moved to position. Change the attributes
+    # between frames to animate it.
+    def __init__(self, mesh, position=(0.0, 0.0, 0.0), angles=(0.0, 0.0, 0.0), scale=1.0):
+        self.mesh = mesh
+        self.position = position
+        self.angles = angles
+        self.scale = scale
+
+class Scene:
+    # Instances drawn together into one z-buffer by Renderer.render_scene. Any number of
+    # instances can share a mesh, which is loaded, and transformed, once for all of them.
+    def __init__(self, instances=()):
+        self.instances = list(instances)
+
+    def add(self, mesh, position=(0.0, 0.0, 0.0), angles=(0.0, 0.0, 0.0), scale=1.0):
+        instance = Instance(mesh, position, angles, scale)
+        self.instances.append(instance)
+        return instance
+
+    def groups(self):
+        # Instances by mesh, in order of each mesh's first instance
+        groups = {}
+        for instance in self.instances:
+            groups.setdefault(instance.mesh, []).append(instance)
+        return groups
+
+    @classmethod
+    def grid(cls, mesh, count, extent=2.0, fill=0.9):
+        # count instances of a mesh in a square-ish grid over [-extent, extent] on x and y,
+        # each scaled to fill its cell
+        columns = max(1, math.ceil(math.sqrt(count)))
+        rows = (count + columns - 1) // columns
+        cell = 2 * extent / max(columns, rows)
+        scale = fill * cell / (2 * mesh.radius) if mesh.radius else 1.0
+        scene = cls()
+        for index in range(count):
+            row, column = divmod(index, columns)
+            scene.add(mesh, ((column - (columns - 1) / 2) * cell, (row - (rows - 1) / 2) * cell, 0.0), scale=scale)
+        return scene
@@ -0,0 +1,127 @@
+import asyncio
+import socket
+import sys
+
+from .terminal import diff_lines
+
+
+# Sent to each client when it connects and when it is dropped: clear the screen and hide
+# the cursor, then show it again
+CLIENT_START = b'\x1b[2J\x1b[?25l'
+CLIENT_END = b'\x1b[?25h\r\n'
+
+# Kernel send buffer of each client socket. Frames sitting in it count as acknowledged,
+# so it bounds how far behind a slow client can fall to a few frames.
+SEND_BUFFER_BYTES = 32 << 10
+
+# Seconds between status lines on stderr when the server runs with log=True
+STATUS_INTERVAL = 5.0
+
+class FrameServer:
+    # Renders an animation once per frame and streams it to every connected TCP client as
+    # terminal escape sequences, so `nc HOST PORT` in a terminal shows it. Each client is
+    # sent the difference between the newest frame and the last frame it acknowledged; a
+    # frame counts as acknowledged once it has been handed in full to the client's socket.
+    # A client that is still sending when newer frames arrive skips straight to the
+    # newest, so slow clients fall behind in frame rate, never in a growing backlog. Frames
+    # are rendered in a worker thread, so serving clients never waits on the rasterizer,
+    # and diffs are shared by all clients that last acknowledged the same frame.
+    def __init__(self, renderer, mesh, fps=30, rotation_speed=0.1):
+        self.renderer = renderer
+        self.mesh = mesh
+        self.budget = 1 / fps
+        self.rotation_speed = rotation_speed
+        self.sequence = 0          # Number of the newest frame, 0 before the first
+        self.lines = []            # Newest frame split into lines
+        self.diffs = {}            # Encoded diffs to the newest frame by the frame they start from
+        self.frame_ready = None
+        self.clients = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.render_time = 0.0     # Seconds spent rendering the newest frame
+
+    def publish(self, frame):
+        self.sequence += 1
+        self.lines = frame.split('\n')
+        self.diffs = {}
+        self.frame_ready.set()
+        self.frame_ready = asyncio.Event()
+
+    def diff(self, sequence, previous_lines):
+        # Bytes that turn the frame a client last acknowledged into the newest one
+        data = self.diffs.get(sequence)
+        if data is None:
+            data = self.diffs[sequence] = diff_lines(previous_lines, self.lines).encode()
+        return data
+
+    async def render_frames(self):
+        loop = asyncio.get_running_loop()
+        speed = self.rotation_speed
+        angle_x = angle_y = angle_z = 0
+        while True:
+            start = loop.time()
+            frame = await loop.run_in_executor(None, self.renderer.render, self.mesh, angle_x, angle_y, angle_z)
+            self.render_time = loop.time() - start
+            self.publish(frame)
+            angle_x += speed
+            angle_y += speed * 0.7
+            angle_z += speed * 0.5
+            await asyncio.sleep(max(0.0, self.budget - (loop.time() - start)))
+
+    async def serve_client(self, reader, writer):
+        # Nothing is read from clients; a frame is acknowledged when drain returns with
+        # the whole frame passed to the socket
+        writer.transport.set_write_buffer_limits(0)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+        self.clients += 1
+        sequence, lines = 0, []
+        try:
+            writer.write(CLIENT_START)
+            while True:
+                while self.sequence == sequence:
+                    await self.frame_ready.wait()
+                if sequence:
+                    self.frames_skipped += self.sequence - sequence - 1
+                data = self.diff(sequence, lines)
+                sequence, lines = self.sequence, self.lines
+                writer.write(data)
+                await writer.drain()
+                self.frames_sent += 1
+                self.bytes_sent += len(data)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.clients -= 1
+            try:
+                writer.write(CLIENT_END)
+                writer.close()
+            except (ConnectionError, OSError, RuntimeError):
+                pass
+
+    def status_line(self):
+        return (f"{self.clients} clients, frame {self.sequence}, render {self.render_time * 1000:.1f} ms, "
+                f"sent {self.frames_sent} frames ({self.bytes_sent} bytes), skipped {self.frames_skipped}")
+
+    async def log_status(self):
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            print(self.status_line(), file=sys.stderr)
+
+    async def serve(self, host='127.0.0.1', port=8765, log=False, started=None):
+        # Runs until cancelled. started, if given, is called with the listening server.
+        self.frame_ready = asyncio.Event()
+        server = await asyncio.start_server(self.serve_client, host, port)
+        tasks = [asyncio.create_task(self.render_frames())]
+        if log:
+            tasks.append(asyncio.create_task(self.log_status()))
+        if started is not None:
+            started(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,55 @@
+# Pipeline stages timed by FrameStats, in order
+STAGES = ('transform', 'cull', 'setup', 'raster', 'shade', 'present')
+
+class FrameStats:
+    # Time spent in each pipeline stage (perf_counter_ns) and rasterizer counters for one
+    # frame. Renderers fill in what they can; front-ends add the present stage.
+    def __init__(self):
+        self.stage_ns = dict.fromkeys(STAGES, 0)
+        self.faces_rendered = 0   # Faces that survived culling
+        self.faces_rejected = 0   # Of those, faces depth ordering found hidden before setup
+        self.pixels_tested = 0    # Covered pixels that went through the z-test
+        self.pixels_written = 0   # Pixels that passed the z-test
+        self.pixels_covered = 0   # Distinct cells drawn in the finished frame
+        self.resolution = None    # Render resolution, when it was scaled for the frame governor
+        self.frame_ns = 0         # Render and present time as measured by the front-end
+        self.cached = False       # Whether the frame came from a frame cache
+
+    @property
+    def overdraw(self):
+        return self.pixels_written / self.pixels_covered if self.pixels_covered else 0.0
+
+    @property
+    def total_ns(self):
+        return sum(self.stage_ns.values())
+
+    def merge(self, other):
+        for stage, elapsed in other.stage_ns.items():
+            self.stage_ns[stage] += elapsed
+        self.faces_rendered += other.faces_rendered
+        self.faces_rejected += other.faces_rejected
+        self.pixels_tested += other.pixels_tested
+        self.pixels_written += other.pixels_written
+        self.pixels_covered += other.pixels_covered
+
+    def as_dict(self):
+        return {
+            'stage_ns': dict(self.stage_ns),
+            'faces_rendered': self.faces_rendered,
+            'faces_rejected': self.faces_rejected,
+            'pixels_tested': self.pixels_tested,
+            'pixels_written': self.pixels_written,
+            'pixels_covered': self.pixels_covered,
+            'overdraw': self.overdraw,
+            'resolution': self.resolution,
+            'frame_ns': self.frame_ns,
+            'cached': self.cached,
+        }
+
+    def status_line(self):
+        if self.cached:
+            return "cached frame"
+        stages = ' '.join(f"{stage} {elapsed / 1e6:.1f}" for stage, elapsed in self.stage_ns.items())
+        rejected = f" ({self.faces_rejected} rejected)" if self.faces_rejected else ""
+        return (f"{stages} ms | faces {self.faces_rendered}{rejected}, tested {self.pixels_tested}, "
+                f"written {self.pixels_written}, overdraw {self.overdraw:.2f}")
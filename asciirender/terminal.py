@@ -0,0 +1,132 @@
+import math
+import os
+import sys
+import time
+
+
+# Unchanged cells shorter than this between two changed runs are rewritten rather than
+# skipped with a cursor move
+PRESENT_GAP = 8
+
+# Frame governor: frames measured at a resolution before it is reconsidered, the share of
+# the frame budget below which the resolution is raised again, and the step it is raised by
+GOVERNOR_SAMPLES = 4
+GOVERNOR_HEADROOM = 0.7
+GOVERNOR_UPSCALE = 1.1
+
+def diff_lines(previous_lines, lines):
+    # Escape sequences that turn a frame split into previous_lines into one split into lines
+    output = []
+    for y, line in enumerate(lines):
+        previous = previous_lines[y] if y < len(previous_lines) else ''
+        if line == previous:
+            continue
+
+        run_start = run_end = None
+        for x in range(len(line)):
+            if x < len(previous) and line[x] == previous[x]:
+                continue
+            if run_end is not None and x - run_end > PRESENT_GAP:
+                output.append(f'\x1b[{y + 1};{run_start + 1}H{line[run_start:run_end]}')
+                run_start = None
+            if run_start is None:
+                run_start = x
+            run_end = x + 1
+        if run_start is not None:
+            output.append(f'\x1b[{y + 1};{run_start + 1}H{line[run_start:run_end]}')
+        if len(line) < len(previous):
+            output.append(f'\x1b[{y + 1};{len(line) + 1}H\x1b[K')
+
+    for y in range(len(lines), len(previous_lines)):
+        output.append(f'\x1b[{y + 1};1H\x1b[K')
+    return ''.join(output)
+
+class TerminalPresenter:
+    # Shows frames on the alternate screen buffer, sending only cursor moves and text for
+    # the cells that changed since the previous frame, in one os.write per frame
+    def __init__(self, fd=None):
+        self.fd = fd
+        self.previous = []
+        self.bytes_written = 0
+
+    def __enter__(self):
+        if os.name == 'nt':
+            os.system('')  # Enables ANSI escape handling in the Windows console
+        self.write('\x1b[?1049h\x1b[?25l\x1b[2J'.encode())
+        return self
+
+    def __exit__(self, *exc_info):
+        self.write('\x1b[?25h\x1b[?1049l'.encode())
+
+    def write(self, data):
+        view = memoryview(data)
+        fd = sys.stdout.fileno() if self.fd is None else self.fd
+        while view:
+            view = view[os.write(fd, view):]
+
+    def diff(self, frame):
+        # Escape sequences that turn the previous frame into this one
+        lines = frame.split('\n')
+        output = diff_lines(self.previous, lines)
+        self.previous = lines
+        return output
+
+    def present(self, frame):
+        data = self.diff(frame).encode()
+        self.write(data)
+        self.bytes_written = len(data)
+        return self.bytes_written
+
+class FrameGovernor:
+    # Paces the interactive loop to a frame time budget. Frames that miss the budget scale
+    # the render resolution down, frames with headroom scale it back up towards the full
+    # resolution, and the time left in the budget is slept away.
+    def __init__(self, target_fps=30, min_scale=0.5):
+        self.budget = 1 / target_fps
+        self.min_scale = min_scale
+        self.scale = 1.0
+        self.frame_time = 0.0   # Render and present seconds of the last frame
+        self.samples = []       # Frame times measured at the current scale
+
+    def resolution(self, width, height):
+        return max(1, round(width * self.scale)), max(1, round(height * self.scale))
+
+    def update(self, frame_time):
+        self.frame_time = frame_time
+        self.samples.append(frame_time)
+        if len(self.samples) < GOVERNOR_SAMPLES:
+            return
+        average = sum(self.samples) / len(self.samples)
+        scale = self.scale
+        if average > self.budget:
+            # Render time is roughly proportional to the number of cells
+            scale = max(self.min_scale, scale * max(0.5, math.sqrt(self.budget / average)))
+        elif average < self.budget * GOVERNOR_HEADROOM:
+            scale = min(1.0, scale * GOVERNOR_UPSCALE)
+        if scale != self.scale:
+            self.scale = scale
+            self.samples = []
+        else:
+            self.samples.pop(0)
+
+    def wait(self):
+        time.sleep(max(0.0, self.budget - self.frame_time))
+
+def upscale_frame(frame, width, height):
+    # Stretches a frame to width x height cells by repeating its rows and columns
+    rows = frame.split('\n')
+    frame_width, frame_height = len(rows[0]), len(rows)
+    if (frame_width, frame_height) == (width, height):
+        return frame
+    columns = [x * frame_width // width for x in range(width)]
+    rows = [''.join([row[x] for x in columns]) for row in rows]
+    return '\n'.join([rows[y * frame_height // height] for y in range(height)])
+
+def contact_sheet(frames, columns, gap=2):
+    # Lays frames of equal size out in rows of columns frames, gap spaces and gap // 2
+    # blank lines apart
+    rows = []
+    for start in range(0, len(frames), columns):
+        split = [frame.split('\n') for frame in frames[start:start + columns]]
+        rows.append('\n'.join((' ' * gap).join(lines) for lines in zip(*split)))
+    return ('\n' * (gap // 2 + 1)).join(rows)
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from asciirender import BACKENDS, Mesh, Renderer, load_mesh, load_obj
+from asciirender.renderer import np
+
+# Benchmark configuration
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'objs')
+MODELS = ['torus', 'axe', 'head', 'teapot_chinese', 'buddha']
+SIZES = [(80, 40), (150, 75), (240, 120)]
+FRAMES = 20
+LOAD_REPEATS = 3
+
+# Same rotation per frame as the interactive loop of ascii-3d-obj-renderer.py
+ROTATION_SPEED = 0.1
+
+# Relative slowdown of a metric over the baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.10
+
+def frame_angles(frames, rotation_speed):
+    # Same angle sequence as the interactive loop in main
+    return [(i * rotation_speed, i * rotation_speed * 0.7, i * rotation_speed * 0.5) for i in range(frames)]
+
+def percentile(sorted_values, fraction):
+    # Linear interpolation between closest ranks
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def latency_stats(latencies):
+    ordered = sorted(latencies)
+    return {
+        'frames': len(latencies),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p90_ms': percentile(ordered, 0.90) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'fps': len(latencies) / sum(latencies),
+    }
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def best_time(function, *args):
+    # Fastest of a few calls, as load times are short and noisy
+    return min(time_call(function, *args)[0] for _ in range(LOAD_REPEATS))
+
+def run_benchmarks(models, sizes, backends, frames):
+    angles = frame_angles(frames, ROTATION_SPEED)
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__ if np is not None else None,
+            'platform': platform.platform(),
+            'frames': frames,
+        },
+        'loads': {},
+        'renders': [],
+        'views': [],
+    }
+
+    for model in models:
+        path = os.path.join(MODELS_DIR, model + '.obj')
+        vertices, faces = load_obj(path)
+        parse_time = best_time(load_obj, path)
+        load = {'parse_s': parse_time, 'vertices': len(vertices), 'faces': len(faces)}
+        if np is not None:
+            load_mesh(path)
+            load['cached_s'] = best_time(load_mesh, path)
+        results['loads'][model] = load
+        print(f"{model}: parse {parse_time:.3f}s" +
+              (f", cached {load['cached_s']:.4f}s" if 'cached_s' in load else ''), file=sys.stderr)
+
+        mesh = Mesh.load(path)
+        for backend in backends:
+            for width, height in sizes:
+                # Renderer.render, as the interactive loop draws, meshlet culling included
+                renderer = Renderer(width, height, backend)
+                renderer.render(mesh, *angles[0])  # Warm-up
+                latencies = [time_call(renderer.render, mesh, *frame)[0] for frame in angles]
+                stats = latency_stats(latencies)
+                results['renders'].append(dict(model=model, backend=backend, width=width, height=height, **stats))
+                print(f"  {backend:>8} {width}x{height}: p50 {stats['p50_ms']:.1f}ms, "
+                      f"p99 {stats['p99_ms']:.1f}ms, {stats['fps']:.1f} fps", file=sys.stderr)
+
+                # Renderer.render_views drawing the same angles in one call, against the
+                # render calls above
+                views_time = time_call(renderer.render_views, mesh, angles)[0]
+                views = {'views': len(angles), 'render_ms': sum(latencies) / len(angles) * 1000,
+                         'render_views_ms': views_time / len(angles) * 1000, 'speedup': sum(latencies) / views_time}
+                results['views'].append(dict(model=model, backend=backend, width=width, height=height, **views))
+                print(f"  {'':>8} render_views: {views['render_views_ms']:.1f}ms per view, "
+                      f"{views['speedup']:.2f}x separate renders", file=sys.stderr)
+    return results
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # Returns (description, baseline value, current value) for every metric that got slower
+    # than the threshold allows
+    regressions = []
+    for model, load in current['loads'].items():
+        for metric in ('parse_s', 'cached_s'):
+            before = baseline['loads'].get(model, {}).get(metric)
+            if before and load.get(metric) is not None and load[metric] > before * (1 + threshold):
+                regressions.append((f"{model} load {metric}", before, load[metric]))
+
+    previous = {(r['model'], r['backend'], r['width'], r['height']): r for r in baseline['renders']}
+    for render in current['renders']:
+        key = (render['model'], render['backend'], render['width'], render['height'])
+        if key not in previous:
+            continue
+        for metric in ('p50_ms', 'p90_ms'):
+            before = previous[key][metric]
+            if render[metric] > before * (1 + threshold):
+                regressions.append((f"{render['model']} {render['backend']} {render['width']}x{render['height']} {metric}",
+                                    before, render[metric]))
+
+    previous = {(r['model'], r['backend'], r['width'], r['height']): r for r in baseline.get('views', [])}
+    for views in current.get('views', []):
+        key = (views['model'], views['backend'], views['width'], views['height'])
+        if key in previous and views['render_views_ms'] > previous[key]['render_views_ms'] * (1 + threshold):
+            regressions.append((f"{views['model']} {views['backend']} {views['width']}x{views['height']} "
+                                f"render_views_ms", previous[key]['render_views_ms'], views['render_views_ms']))
+    return regressions
+
+def compare_memory(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # The same for two --memprofile files of ascii-3d-obj-renderer.py: overall peak, steady
+    # state and the mean per-frame peak of each stage
+    metrics = [(metric, baseline.get(metric), current[metric]) for metric in ('peak_bytes', 'steady_state_bytes')]
+    for stage, figures in current['stages'].items():
+        metrics.append((f"{stage} peak_bytes_mean", baseline['stages'].get(stage, {}).get('peak_bytes_mean'),
+                        figures['peak_bytes_mean']))
+    return [(name, before, after) for name, before, after in metrics if before and after > before * (1 + threshold)]
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ascii-3d-obj-renderer.py on the bundled models.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="run the benchmark and save the results as JSON")
+    run.add_argument('--models', nargs='+', default=MODELS, help="models from objs/ (default: all)")
+    run.add_argument('--sizes', nargs='+', type=parse_size, default=SIZES, metavar='WxH',
+                     help="screen sizes (default: 80x40 150x75 240x120)")
+    run.add_argument('--backends', nargs='+', help="rasterizer backends (default: all available)")
+    run.add_argument('--frames', type=int, default=FRAMES, help=f"timed frames per run (default: {FRAMES})")
+    run.add_argument('--output', default='benchmark.json', help="results file (default: benchmark.json)")
+
+    compare = commands.add_parser('compare', help="flag regressions of a results file, or of a --memprofile "
+                                                  "file of ascii-3d-obj-renderer.py, against a baseline")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                         help=f"allowed relative slowdown (default: {REGRESSION_THRESHOLD})")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        backends = args.backends
+        if backends is None:
+            backends = [name for name, backend in BACKENDS.items() if backend.available()]
+        results = run_benchmarks(args.models, args.sizes, backends, args.frames)
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+        # Memory profiles have per-stage figures, benchmark results do not
+        if ('stages' in baseline) != ('stages' in current):
+            parser.error("cannot compare a --memprofile file with benchmark results; "
+                         "both files must be of the same kind")
+        compare = compare_memory if 'stages' in current else compare_results
+        regressions = compare(baseline, current, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.4g} -> {after:.4g} ({(after / before - 1) * 100:+.1f}%)")
+        if not regressions:
+            print("No regressions")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
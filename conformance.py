@@ -0,0 +1,178 @@
+import argparse
+import os
+import runpy
+import sys
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from asciirender import BACKENDS, BandWorkers, Mesh, Renderer
+from asciirender.renderer import DEPTH_STEEPNESS, np
+
+# Conformance configuration: every model in objs/ and the cube demo's cube, drawn at these
+# angles and compared cell for cell with golden frames
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(ROOT, 'objs')
+GOLDEN_DIR = os.path.join(ROOT, 'golden')
+SCREEN_WIDTH = 80
+SCREEN_HEIGHT = 40
+ANGLES = [(0.0, 0.0, 0.0), (0.5, 0.35, 0.25), (1.3, 2.1, 0.7), (2.6, 4.0, 5.2)]
+
+# Backend the golden frames are rendered with by --update
+REFERENCE_BACKEND = 'scanline'
+
+# Threads rendering at once for backends that support it, and band worker processes
+THREADS = 4
+BAND_WORKERS = 2
+
+# Allocation check: screen sizes drawn by the scanline backend, frames drawn first to fill
+# the per-thread buffers, and the bytes a frame may allocate beyond its text over what it
+# allocates at the smallest size
+ALLOCATION_SIZES = [(80, 40), (160, 80), (320, 160)]
+ALLOCATION_WARMUP = 2
+ALLOCATION_SLACK = 4096
+
+def load_models(names=None):
+    # (name, mesh, width, height, Renderer options) of each model, the cube as its demo draws it
+    cube = runpy.run_path(os.path.join(ROOT, 'ascii-3d-cube.py'))
+    cube_options = {'camera_distance': cube['CAMERA_DISTANCE'], 'depth_steepness': cube['DEPTH_STEEPNESS'],
+                    'depth_range': cube['DEPTH_RANGE'], 'nearest_wins': True}
+    models = [('cube', cube['CUBE'], cube['SCREEN_WIDTH'], cube['SCREEN_HEIGHT'], cube_options)]
+    for filename in sorted(os.listdir(MODELS_DIR)):
+        if filename.endswith('.obj'):
+            mesh = Mesh.load(os.path.join(MODELS_DIR, filename))
+            models.append((filename[:-4], mesh, SCREEN_WIDTH, SCREEN_HEIGHT, {'depth_steepness': DEPTH_STEEPNESS}))
+    return [model for model in models if names is None or model[0] in names]
+
+def variants():
+    # (label, backend, Renderer options, how frames are drawn) of every available
+    # configuration that must match the reference
+    for name, backend in sorted(BACKENDS.items()):
+        if not backend.available():
+            continue
+        yield name, name, {}, 'render'
+        yield f'{name} views', name, {}, 'views'
+        yield f'{name} deferred', name, {'deferred': True}, 'render'
+        if backend.depth_ordering:
+            yield f'{name} depth-ordered', name, {'depth_ordered': True}, 'render'
+        if backend.threads:
+            yield f'{name} threads', name, {}, 'threads'
+        if backend.bands:
+            yield f'{name} bands', name, {}, 'bands'
+
+def render_frames(renderer, mesh, how):
+    if how == 'views':
+        return renderer.render_views(mesh, ANGLES)
+    if how == 'threads':
+        with ThreadPoolExecutor(THREADS) as pool:
+            return list(pool.map(lambda angles: renderer.render(mesh, *angles), ANGLES))
+    if how == 'bands':
+        with BandWorkers(mesh.vertices, mesh.faces, BAND_WORKERS, renderer) as workers:
+            return [workers.render(renderer, *angles) for angles in ANGLES]
+    return [renderer.render(mesh, *angles) for angles in ANGLES]
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, name + '.txt')
+
+def read_golden(name):
+    # Frames separated by form feed lines, as the turntable text format
+    with open(golden_path(name), encoding='latin-1', newline='\n') as file:
+        return file.read().split('\n\f\n')[:-1]
+
+def write_golden(name, frames):
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(golden_path(name), 'w', encoding='latin-1', newline='\n') as file:
+        file.write(''.join(frame + '\n\f\n' for frame in frames))
+
+def differences(expected, actual):
+    # (row, column, expected, actual) of every cell that differs, the frame size included
+    expected_rows, actual_rows = expected.split('\n'), actual.split('\n')
+    if [len(row) for row in expected_rows] != [len(row) for row in actual_rows]:
+        return [(None, None, f"{len(expected_rows[0])}x{len(expected_rows)}",
+                 f"{len(actual_rows[0])}x{len(actual_rows)}")]
+    return [(y, x, a, b) for y, (expected_row, actual_row) in enumerate(zip(expected_rows, actual_rows))
+            for x, (a, b) in enumerate(zip(expected_row, actual_row)) if a != b]
+
+def check(models):
+    # Prints a line per model and variant and returns the number of frames that differ and
+    # the number compared. Variants that cannot draw a model with its options are skipped.
+    failures = compared = 0
+    for name, mesh, width, height, model_options in models:
+        golden = read_golden(name)
+        for label, backend, options, how in variants():
+            try:
+                renderer = Renderer(width, height, backend, **model_options, **options)
+            except ValueError:
+                print(f"skip {name} {label}")
+                continue
+            frames = render_frames(renderer, mesh, how)
+            compared += len(frames)
+            mismatched = 0
+            for index, (expected, actual) in enumerate(zip(golden, frames)):
+                cells = differences(expected, actual)
+                if cells:
+                    mismatched += 1
+                    y, x, a, b = cells[0]
+                    where = "size" if y is None else f"row {y} column {x}"
+                    print(f"  {name} {label} angles {ANGLES[index]}: {len(cells)} cells differ, "
+                          f"first at {where}: {a!r} expected, {b!r} drawn")
+            failures += mismatched
+            print(f"{'FAIL' if mismatched else 'ok':>4} {name} {label}")
+    return failures, compared
+
+def frame_allocation(renderer, mesh, angles):
+    # Peak traced bytes of one steady-state frame beyond the size of its text
+    for _ in range(ALLOCATION_WARMUP):
+        renderer.render(mesh, *angles)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        frame = renderer.render(mesh, *angles)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak - start - sys.getsizeof(frame)
+
+def check_allocations(models):
+    # Prints a line per model and returns the number of models whose scanline frames
+    # allocate more at larger sizes than at the smallest: the frame buffers are reused, so
+    # only the frame's text should grow with the screen
+    failures = 0
+    for name, mesh, _, _, model_options in models:
+        extra = [frame_allocation(Renderer(width, height, REFERENCE_BACKEND, **model_options), mesh, ANGLES[1])
+                 for width, height in ALLOCATION_SIZES]
+        failed = max(extra) > extra[0] + ALLOCATION_SLACK
+        failures += failed
+        print(f"{'FAIL' if failed else 'ok':>4} {name} allocations beyond the frame: " +
+              ", ".join(f"{width}x{height} {size} bytes" for (width, height), size in zip(ALLOCATION_SIZES, extra)))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check every rasterizer backend against golden frames.")
+    parser.add_argument('--models', nargs='+', help="models to check, 'cube' or names from objs/ (default: all)")
+    parser.add_argument('--allocations', action='store_true',
+                        help="check instead that steady-state scanline frames allocate nothing that grows with "
+                             "the screen size beyond the frame's text")
+    parser.add_argument('--update', action='store_true',
+                        help=f"render the golden frames again with the {REFERENCE_BACKEND} backend")
+    args = parser.parse_args()
+
+    print("backends: " + ", ".join(
+        f"{name} ({', '.join(capability for capability, value in backend.capabilities().items() if value) or '-'}"
+        f"{'' if backend.available() else ', unavailable'})" for name, backend in sorted(BACKENDS.items())))
+    models = load_models(args.models)
+    if args.update:
+        for name, mesh, width, height, model_options in models:
+            renderer = Renderer(width, height, REFERENCE_BACKEND, **model_options)
+            write_golden(name, render_frames(renderer, mesh, 'render'))
+            print(f"Wrote {golden_path(name)}")
+        return
+    if args.allocations:
+        failures = check_allocations(models)
+        print(f"{failures} of {len(models)} models allocate more at larger sizes")
+        sys.exit(1 if failures else 0)
+    failures, compared = check(models)
+    print(f"{failures} of {compared} frames differ")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import tracemalloc
+
+from asciirender import Mesh, Renderer
+
+# A steady-state scanline frame of this model at this size, after the warm-up frames have
+# filled the per-thread buffers, may allocate at most this many bytes at its peak, its
+# text included. The frame reads the face setup arrays in place, so what it allocates is
+# NumPy's per-face work arrays and nothing per pixel.
+MODEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'objs', 'head.obj')
+WIDTH = 150
+HEIGHT = 75
+ANGLES = (0.5, 0.35, 0.25)
+WARMUP = 2
+FRAME_ALLOCATION_LIMIT = 512 * 1024
+
+# Bytes a frame at twice the size may allocate beyond its text over one at this size
+SCREEN_GROWTH_SLACK = 4096
+
+def frame_allocation(renderer, mesh, angles):
+    # Peak traced bytes of one frame over what was allocated before it, and the frame
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        frame = renderer.render(mesh, *angles)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak - start, frame
+
+def test_frame_allocation_is_bounded():
+    mesh = Mesh.load(MODEL)
+    renderer = Renderer(WIDTH, HEIGHT)
+    for _ in range(WARMUP):
+        expected = renderer.render(mesh, *ANGLES)
+    allocated, frame = frame_allocation(renderer, mesh, ANGLES)
+    assert frame == expected
+    assert allocated <= FRAME_ALLOCATION_LIMIT, f"{allocated} bytes allocated drawing one frame"
+
+def test_frame_allocation_does_not_grow_with_the_screen():
+    mesh = Mesh.load(MODEL)
+    extra = []
+    for width, height in ((WIDTH, HEIGHT), (WIDTH * 2, HEIGHT * 2)):
+        renderer = Renderer(width, height)
+        for _ in range(WARMUP):
+            renderer.render(mesh, *ANGLES)
+        allocated, frame = frame_allocation(renderer, mesh, ANGLES)
+        extra.append(allocated - sys.getsizeof(frame))
+    assert extra[1] <= extra[0] + SCREEN_GROWTH_SLACK, f"{extra[0]} bytes beyond the frame at {WIDTH}x{HEIGHT}, {extra[1]} at double"